@@ -3,6 +3,16 @@ import os
 import hashlib
 from typing import Dict, Any
 
+def bump_role_count(cur, organization_id, role, delta: int) -> None:
+    '''Write-through обновление агрегата user_role_counts'''
+    cur.execute("""
+        INSERT INTO t_p80499285_psot_realization_pro.user_role_counts (organization_id, role, user_count)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (organization_id, role) DO UPDATE
+        SET user_count = user_role_counts.user_count + EXCLUDED.user_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, (organization_id or 0, role or 'user', delta))
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Authentication and user registration for ASUBT system
@@ -210,6 +220,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 cur.execute(
                     f"INSERT INTO t_p80499285_psot_realization_pro.user_stats (user_id) VALUES ({user_id})"
                 )
+                bump_role_count(cur, organization_id, 'user', 1)
                 
                 conn.commit()
                 cur.close()
@@ -289,71 +300,40 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             conn.close()
             
             if result:
-                from datetime import datetime
                 user_blocked = result[6]
-                user_blocked_until = result[7]
                 org_blocked = result[8]
                 org_blocked_until = result[9]
                 
+                # Истёкшие блокировки снимает block-management action=sweep, флаг is_blocked актуален
                 if user_blocked:
-                    if user_blocked_until and datetime.now() < user_blocked_until:
-                        return {
-                            'statusCode': 403,
-                            'headers': {
-                                'Content-Type': 'application/json',
-                                'Access-Control-Allow-Origin': '*'
-                            },
-                            'isBase64Encoded': False,
-                            'body': json.dumps({
-                                'success': False, 
-                                'error': 'blocked',
-                                'message': f'Ваш аккаунт был заблокирован по неизвестной причине, просьба обратиться к администратору вашего предприятия, не забудьте назвать свой id №{result[0]}'
-                            })
-                        }
-                    elif not user_blocked_until:
-                        return {
-                            'statusCode': 403,
-                            'headers': {
-                                'Content-Type': 'application/json',
-                                'Access-Control-Allow-Origin': '*'
-                            },
-                            'isBase64Encoded': False,
-                            'body': json.dumps({
-                                'success': False, 
-                                'error': 'blocked',
-                                'message': f'Ваш аккаунт был заблокирован по неизвестной причине, просьба обратиться к администратору вашего предприятия, не забудьте назвать свой id №{result[0]}'
-                            })
-                        }
+                    return {
+                        'statusCode': 403,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'isBase64Encoded': False,
+                        'body': json.dumps({
+                            'success': False, 
+                            'error': 'blocked',
+                            'message': f'Ваш аккаунт был заблокирован по неизвестной причине, просьба обратиться к администратору вашего предприятия, не забудьте назвать свой id №{result[0]}'
+                        })
+                    }
                 
                 if org_blocked and result[5]:
-                    if org_blocked_until and datetime.now() < org_blocked_until:
-                        return {
-                            'statusCode': 403,
-                            'headers': {
-                                'Content-Type': 'application/json',
-                                'Access-Control-Allow-Origin': '*'
-                            },
-                            'isBase64Encoded': False,
-                            'body': json.dumps({
-                                'success': False, 
-                                'error': 'blocked',
-                                'message': 'Ваше предприятие временно заблокировано. Обратитесь к главному администратору системы.'
-                            })
-                        }
-                    elif not org_blocked_until:
-                        return {
-                            'statusCode': 403,
-                            'headers': {
-                                'Content-Type': 'application/json',
-                                'Access-Control-Allow-Origin': '*'
-                            },
-                            'isBase64Encoded': False,
-                            'body': json.dumps({
-                                'success': False, 
-                                'error': 'blocked',
-                                'message': 'Ваше предприятие заблокировано. Обратитесь к главному администратору системы.'
-                            })
-                        }
+                    return {
+                        'statusCode': 403,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'isBase64Encoded': False,
+                        'body': json.dumps({
+                            'success': False, 
+                            'error': 'blocked',
+                            'message': 'Ваше предприятие временно заблокировано. Обратитесь к главному администратору системы.' if org_blocked_until else 'Ваше предприятие заблокировано. Обратитесь к главному администратору системы.'
+                        })
+                    }
                 
                 return {
                     'statusCode': 200,
@@ -4,10 +4,95 @@ import psycopg2
 from typing import Dict, Any
 from datetime import datetime
 
+SWEEP_LOCK_KEY = 804992850035
+SWEEP_BATCH_SIZE = 500
+SYSTEM_PERFORMER_ID = 0
+
+EXPIRED_BLOCKS_SQL = '''
+    WITH expired AS (
+        SELECT id FROM {table}
+        WHERE is_blocked = true AND blocked_until <= CURRENT_TIMESTAMP
+        ORDER BY blocked_until
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ), released AS (
+        UPDATE {table} t
+        SET is_blocked = false, blocked_until = NULL, block_reason = NULL
+        FROM expired
+        WHERE t.id = expired.id
+        RETURNING t.id
+    )
+    INSERT INTO t_p80499285_psot_realization_pro.block_history
+    (entity_type, entity_id, action, reason, performed_by)
+    SELECT %s, id, 'unblock', 'Срок блокировки истёк', %s FROM released
+'''
+
+EXPIRED_TRIALS_SQL = '''
+    WITH expired AS (
+        SELECT id, trial_end_date FROM t_p80499285_psot_realization_pro.organizations
+        WHERE is_active = true AND trial_end_date <= CURRENT_TIMESTAMP
+          AND (trial_expired_at IS NULL OR trial_expired_at < trial_end_date)
+        ORDER BY trial_end_date
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ), deactivated AS (
+        UPDATE t_p80499285_psot_realization_pro.organizations o
+        SET is_active = false, trial_expired_at = CURRENT_TIMESTAMP
+        FROM expired
+        WHERE o.id = expired.id
+        RETURNING o.id, expired.trial_end_date
+    )
+    INSERT INTO t_p80499285_psot_realization_pro.block_history
+    (entity_type, entity_id, action, blocked_until, reason, performed_by)
+    SELECT 'organization', id, 'trial_expired', trial_end_date, 'Пробный период истёк', %s FROM deactivated
+'''
+
+def sweep_in_batches(conn, cur, sql: str, params: tuple) -> int:
+    '''Прогон запроса пачками с коммитом после каждой, пока есть что обрабатывать'''
+    total = 0
+    while True:
+        cur.execute(sql, params)
+        processed = cur.rowcount
+        conn.commit()
+        total += processed
+        if processed < SWEEP_BATCH_SIZE:
+            return total
+
+def run_expiry_sweep(conn, cur) -> Dict[str, Any]:
+    '''Снятие истёкших блокировок и отключение предприятий с истёкшим пробным периодом под advisory lock'''
+    cur.execute('SELECT pg_try_advisory_lock(%s)', (SWEEP_LOCK_KEY,))
+    if not cur.fetchone()[0]:
+        return {'skipped': True}
+    
+    try:
+        users_unblocked = sweep_in_batches(
+            conn, cur,
+            EXPIRED_BLOCKS_SQL.format(table='t_p80499285_psot_realization_pro.users'),
+            (SWEEP_BATCH_SIZE, 'user', SYSTEM_PERFORMER_ID)
+        )
+        organizations_unblocked = sweep_in_batches(
+            conn, cur,
+            EXPIRED_BLOCKS_SQL.format(table='t_p80499285_psot_realization_pro.organizations'),
+            (SWEEP_BATCH_SIZE, 'organization', SYSTEM_PERFORMER_ID)
+        )
+        trials_expired = sweep_in_batches(
+            conn, cur, EXPIRED_TRIALS_SQL, (SWEEP_BATCH_SIZE, SYSTEM_PERFORMER_ID)
+        )
+    finally:
+        conn.rollback()
+        cur.execute('SELECT pg_advisory_unlock(%s)', (SWEEP_LOCK_KEY,))
+    
+    return {
+        'skipped': False,
+        'users_unblocked': users_unblocked,
+        'organizations_unblocked': organizations_unblocked,
+        'trials_expired': trials_expired
+    }
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     API управления блокировками пользователей и предприятий
-    POST - заблокировать/разблокировать
+    POST - заблокировать/разблокировать; action=sweep - плановое снятие истёкших блокировок и пробных периодов
     GET - получить информацию о блокировке
     entity_type: user или organization
     '''
@@ -65,18 +150,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        is_blocked = row[0]
-        blocked_until = row[1]
-        
-        if is_blocked and blocked_until:
-            if datetime.now() > blocked_until:
-                is_blocked = False
-        
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({
-                'is_blocked': is_blocked,
+                'is_blocked': row[0],
                 'blocked_until': row[1].isoformat() if row[1] else None,
                 'block_reason': row[2],
                 'blocked_at': row[3].isoformat() if row[3] else None
@@ -86,6 +164,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     elif method == 'POST':
         body = json.loads(event.get('body', '{}'))
+        
+        if body.get('action') == 'sweep':
+            result = run_expiry_sweep(conn, cur)
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
         entity_type = body.get('entity_type')
         entity_id = body.get('entity_id')
         action = body.get('action')
@@ -0,0 +1,169 @@
+import json
+import os
+import time
+import psycopg2
+from psycopg2.extras import Json
+from typing import Dict, Any, Optional, Tuple
+
+VERSION_CHECK_TTL = 5
+
+_entitlements_cache: Dict[int, Tuple[float, int, Dict[str, Any]]] = {}
+
+def get_db_connection():
+    """Создает подключение к базе данных"""
+    dsn = os.environ.get('DATABASE_URL')
+    return psycopg2.connect(dsn)
+
+def resolve_entitlements(cur, org_id: int) -> Optional[Dict[str, Any]]:
+    """Сборка документа прав из модулей, страниц, тарифа и плана подписки (разрешение в SQL-функции resolve_entitlements)"""
+    cur.execute("SELECT t_p80499285_psot_realization_pro.resolve_entitlements(%s)", (org_id,))
+    row = cur.fetchone()
+    if not row or row[0] is None:
+        return None
+    
+    raw = row[0]
+    plan = raw['plan'] or {}
+    features = dict(plan.get('features') or {})
+    storage_gb = features.pop('storage_gb', None)
+    features['components'] = raw['components']
+    
+    return {
+        'organization_id': org_id,
+        'plan': {'id': plan['id'], 'name': plan['name']} if plan else None,
+        'modules': raw['modules'],
+        'pages': raw['pages'],
+        'limits': {
+            'max_users': plan.get('max_users'),
+            'storage_gb': storage_gb
+        },
+        'features': features
+    }
+
+def get_entitlements(org_id: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Права предприятия с версией: кэш контейнера, затем сохранённый документ, затем пересчёт"""
+    now = time.monotonic()
+    cached = _entitlements_cache.get(org_id)
+    if cached and cached[0] > now:
+        return cached[1], cached[2]
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT version, document FROM t_p80499285_psot_realization_pro.organization_entitlements
+            WHERE organization_id = %s
+        """, (org_id,))
+        row = cur.fetchone()
+        
+        if not row:
+            cur.execute("SELECT 1 FROM t_p80499285_psot_realization_pro.organizations WHERE id = %s", (org_id,))
+            if not cur.fetchone():
+                return None
+            cur.execute("""
+                INSERT INTO t_p80499285_psot_realization_pro.organization_entitlements (organization_id)
+                VALUES (%s)
+                ON CONFLICT (organization_id) DO UPDATE SET organization_id = EXCLUDED.organization_id
+                RETURNING version, document
+            """, (org_id,))
+            row = cur.fetchone()
+            conn.commit()
+        
+        version, document = row
+        
+        if cached and cached[1] == version:
+            document = cached[2]
+        elif document is None:
+            document = resolve_entitlements(cur, org_id)
+            if document is None:
+                return None
+            # Сохраняем только если за время пересчёта версия не изменилась
+            cur.execute("""
+                UPDATE t_p80499285_psot_realization_pro.organization_entitlements
+                SET document = %s, computed_at = CURRENT_TIMESTAMP
+                WHERE organization_id = %s AND version = %s
+            """, (Json(document), org_id, version))
+            conn.commit()
+        
+        document['version'] = version
+        _entitlements_cache[org_id] = (now + VERSION_CHECK_TTL, version, document)
+        return version, document
+    finally:
+        cur.close()
+        conn.close()
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Эффективные права предприятия одним документом
+    GET /?organization_id=X - модули, страницы, лимиты (max_users, storage_gb) и функции тарифа с версией
+    Версия растёт при любой записи, влияющей на права; ETag = версия, If-None-Match даёт 304
+    """
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    org_id = params.get('organization_id')
+    
+    if not org_id:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'organization_id обязателен'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    result = get_entitlements(int(org_id))
+    
+    if not result:
+        return {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Организация не найдена'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    version, document = result
+    etag = f'"{org_id}-{version}"'
+    headers = event.get('headers') or {}
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    
+    response_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'ETag': etag
+    }
+    
+    if if_none_match == etag:
+        return {
+            'statusCode': 304,
+            'headers': response_headers,
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': response_headers,
+        'body': json.dumps(document, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,212 @@
+import json
+import os
+import time
+import psycopg2
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Any, List, Optional, Tuple
+
+TOP_N = 100
+MAX_PAGE_SIZE = 200
+LEADERBOARD_CACHE_TTL = 60
+REFRESH_LOCK_KEY = 804992850049
+
+PERIODS = ('all', 'year', 'month')
+
+BOARDS = {
+    'organizations': {
+        'view': 't_p80499285_psot_realization_pro.leaderboard_organizations',
+        'id_column': 'organization_id',
+        'name_column': 'name'
+    },
+    'users': {
+        'view': 't_p80499285_psot_realization_pro.leaderboard_users',
+        'id_column': 'user_id',
+        'name_column': 'fio'
+    }
+}
+
+_top_cache: Dict[Tuple[str, str, Optional[int]], Tuple[float, List[Dict[str, Any]], Optional[str]]] = {}
+
+def get_db_connection():
+    """Создает подключение к базе данных"""
+    dsn = os.environ.get('DATABASE_URL')
+    return psycopg2.connect(dsn)
+
+def fetch_page(board: str, period: str, organization_id: Optional[int], limit: int, cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+    """Страница рейтинга из материализованного представления по индексу (period, score DESC, id DESC)"""
+    config = BOARDS[board]
+    filters = ['period = %s']
+    values: List[Any] = [period]
+    position = 0
+    
+    if organization_id:
+        filters.append('organization_id = %s')
+        values.append(organization_id)
+    
+    if cursor:
+        cursor_score, cursor_id, cursor_position = cursor.split('|')
+        try:
+            score = Decimal(cursor_score)
+        except InvalidOperation:
+            raise ValueError(f'Некорректный счёт в курсоре: {cursor_score}')
+        if not score.is_finite():
+            raise ValueError(f'Некорректный счёт в курсоре: {cursor_score}')
+        filters.append(f"(score, {config['id_column']}) < (%s, %s)")
+        values.extend([score, int(cursor_id)])
+        position = int(cursor_position)
+    
+    values.append(limit)
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT {config['id_column']}, {config['name_column']}, organization_id, score, refreshed_at
+            FROM {config['view']}
+            WHERE {' AND '.join(filters)}
+            ORDER BY score DESC, {config['id_column']} DESC
+            LIMIT %s
+        """, values)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+    
+    items = [{
+        'position': position + index + 1,
+        'id': row[0],
+        'name': row[1],
+        'organization_id': row[2],
+        'score': float(row[3])
+    } for index, row in enumerate(rows)]
+    
+    refreshed_at = rows[0][4].isoformat() if rows and rows[0][4] else None
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = f"{rows[-1][3]}|{rows[-1][0]}|{position + len(rows)}"
+    
+    return items, next_cursor, refreshed_at
+
+def get_leaderboard(board: str, period: str, organization_id: Optional[int], limit: int, cursor: Optional[str]) -> Dict[str, Any]:
+    """Рейтинг: первые TOP_N мест из кэша контейнера, дальше - keyset-страницы из представления"""
+    if cursor or limit > TOP_N:
+        items, next_cursor, refreshed_at = fetch_page(board, period, organization_id, limit, cursor)
+        return {'items': items, 'next_cursor': next_cursor, 'refreshed_at': refreshed_at}
+    
+    key = (board, period, organization_id)
+    now = time.monotonic()
+    cached = _top_cache.get(key)
+    if not cached or cached[0] <= now:
+        items, next_cursor, refreshed_at = fetch_page(board, period, organization_id, TOP_N, None)
+        cached = (now + LEADERBOARD_CACHE_TTL, items, refreshed_at)
+        _top_cache[key] = cached
+    
+    items = cached[1][:limit]
+    next_cursor = None
+    if len(items) == limit and (len(cached[1]) > limit or len(cached[1]) == TOP_N):
+        last = items[-1]
+        next_cursor = f"{last['score']}|{last['id']}|{last['position']}"
+    
+    return {'items': items, 'next_cursor': next_cursor, 'refreshed_at': cached[2]}
+
+def refresh_leaderboards() -> Dict[str, Any]:
+    """Обновление представлений рейтинга без блокировки чтения; повторный запуск во время обновления пропускается"""
+    conn = get_db_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT pg_try_advisory_lock(%s)', (REFRESH_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return {'skipped': True}
+        
+        try:
+            started = time.monotonic()
+            for config in BOARDS.values():
+                cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {config['view']}")
+        finally:
+            cur.execute('SELECT pg_advisory_unlock(%s)', (REFRESH_LOCK_KEY,))
+    finally:
+        cur.close()
+        conn.close()
+    
+    _top_cache.clear()
+    return {'skipped': False, 'duration_ms': round((time.monotonic() - started) * 1000)}
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Рейтинги по баллам и активности
+    GET /?board=organizations|users&period=all|year|month - рейтинг (organization_id - пользователи одного предприятия)
+    limit и cursor - постраничная выдача после первых мест; данные из представлений, обновляемых по расписанию
+    POST / action=refresh - обновить представления рейтингов
+    """
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method == 'POST':
+        body = json.loads(event.get('body') or '{}')
+        if body.get('action') != 'refresh':
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Неизвестное действие'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(refresh_leaderboards(), ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    board = params.get('board', 'organizations')
+    period = params.get('period', 'all')
+    
+    if board not in BOARDS or period not in PERIODS:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'board: organizations или users; period: all, year или month'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        organization_id = int(params['organization_id']) if board == 'users' and params.get('organization_id') else None
+        limit = min(int(params.get('limit') or 20), MAX_PAGE_SIZE)
+        result = get_leaderboard(board, period, organization_id, max(limit, 1), params.get('cursor'))
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Некорректные organization_id, limit или cursor'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    result.update(board=board, period=period)
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(result, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
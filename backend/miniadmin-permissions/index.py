@@ -3,6 +3,16 @@ import os
 import psycopg2
 from typing import Dict, Any
 
+def bump_role_count(cur, organization_id, role, delta: int) -> None:
+    '''Write-through обновление агрегата user_role_counts'''
+    cur.execute("""
+        INSERT INTO t_p80499285_psot_realization_pro.user_role_counts (organization_id, role, user_count)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (organization_id, role) DO UPDATE
+        SET user_count = user_role_counts.user_count + EXCLUDED.user_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, (organization_id or 0, role or 'user', delta))
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Управление правами минадминистраторов
@@ -94,7 +104,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         safe_assigned_by = int(assigned_by) if assigned_by else 'NULL'
         
         cur.execute(f'''
-            SELECT role FROM t_p80499285_psot_realization_pro.users WHERE id = {safe_user_id}
+            SELECT role, organization_id FROM t_p80499285_psot_realization_pro.users WHERE id = {safe_user_id} FOR UPDATE
         ''')
         user_role = cur.fetchone()
         
@@ -104,6 +114,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 SET role = 'miniadmin', updated_at = CURRENT_TIMESTAMP
                 WHERE id = {safe_user_id}
             ''')
+            bump_role_count(cur, user_role[1], user_role[0], -1)
+            bump_role_count(cur, user_role[1], 'miniadmin', 1)
         
         for perm in permissions:
             module = perm.get('module', '')
@@ -1,12 +1,83 @@
 import json
 import os
+import time
 import psycopg2
 from typing import Dict, Any
 
+CATALOG_CACHE_TTL = 60
+
+_catalog_cache: Dict[int, tuple] = {}
+
+def bump_entitlements_version(cur, organization_id) -> None:
+    '''Новая версия прав предприятия: документ пересчитает entitlements при следующем запросе'''
+    cur.execute('''
+        INSERT INTO t_p80499285_psot_realization_pro.organization_entitlements (organization_id, version)
+        VALUES (%s, 1)
+        ON CONFLICT (organization_id) DO UPDATE
+        SET version = organization_entitlements.version + 1,
+            document = NULL,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (organization_id,))
+
+def get_org_catalog(cur, org_id: int) -> Dict[str, Any]:
+    '''Модули и страницы с флагами подключения одним запросом; кэш по версии прав предприятия'''
+    cur.execute('''
+        SELECT COALESCE(MAX(version), 0)
+        FROM t_p80499285_psot_realization_pro.organization_entitlements
+        WHERE organization_id = %s
+    ''', (org_id,))
+    version = cur.fetchone()[0]
+    
+    now = time.monotonic()
+    cached = _catalog_cache.get(org_id)
+    if cached and cached[0] > now and cached[1] == version:
+        return cached[2]
+    
+    cur.execute('''
+        SELECT 'module', m.id, m.name, m.description, m.module_type, NULL, NULL, m.is_active, om.id IS NOT NULL
+        FROM t_p80499285_psot_realization_pro.modules m
+        LEFT JOIN t_p80499285_psot_realization_pro.organization_modules om
+            ON om.module_id = m.id AND om.organization_id = %s
+        WHERE m.is_active = true
+        UNION ALL
+        SELECT 'page', p.id, p.name, p.description, NULL, p.route, p.icon, p.is_active, op.id IS NOT NULL
+        FROM t_p80499285_psot_realization_pro.pages p
+        LEFT JOIN t_p80499285_psot_realization_pro.organization_pages op
+            ON op.page_id = p.id AND op.organization_id = %s
+        WHERE p.is_active = true
+        ORDER BY 3
+    ''', (org_id, org_id))
+    
+    catalog = {'modules': [], 'pages': [], 'version': version}
+    for row in cur.fetchall():
+        if row[0] == 'module':
+            catalog['modules'].append({
+                'id': row[1],
+                'name': row[2],
+                'description': row[3],
+                'module_type': row[4],
+                'is_active': row[7],
+                'enabled': row[8]
+            })
+        else:
+            catalog['pages'].append({
+                'id': row[1],
+                'name': row[2],
+                'route': row[5],
+                'icon': row[6],
+                'description': row[3],
+                'is_active': row[7],
+                'enabled': row[8]
+            })
+    
+    _catalog_cache[org_id] = (now + CATALOG_CACHE_TTL, version, catalog)
+    return catalog
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Управление модулями и страницами организации
     GET - получить все модули/страницы или для конкретной организации
+    GET ?type=all&organization_id=X - модули и страницы организации одним запросом
     POST - подключить модуль/страницу к организации
     PUT - отключить модуль/страницу от организации
     '''
@@ -34,7 +105,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         org_id = params.get('organization_id')
         resource_type = params.get('type', 'modules')
         
-        if resource_type == 'modules':
+        if resource_type == 'all':
+            if not org_id:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'organization_id required'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            items = get_org_catalog(cur, int(org_id))
+        elif resource_type == 'modules':
             if org_id:
                 cur.execute('''
                     SELECT m.id, m.name, m.description, m.module_type, m.is_active,
@@ -147,7 +230,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
+        bump_entitlements_version(cur, org_id)
         conn.commit()
+        _catalog_cache.pop(int(org_id), None)
         cur.close()
         conn.close()
         
@@ -189,7 +274,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     ON CONFLICT (organization_id, page_id) DO NOTHING
                 ''', (org_id, item_id))
         
+        bump_entitlements_version(cur, org_id)
         conn.commit()
+        _catalog_cache.pop(int(org_id), None)
         cur.close()
         conn.close()
         
@@ -1,11 +1,61 @@
 import json
 import os
-from typing import Dict, Any
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List
+
+TYPEAHEAD_DEFAULT_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+TYPEAHEAD_CACHE_TTL = 60
+TYPEAHEAD_CACHE_SIZE = 512
+
+_typeahead_cache: 'OrderedDict[tuple, tuple]' = OrderedDict()
+
+def search_users_by_prefix(organization_id: int, prefix: str, limit: int) -> List[Dict[str, Any]]:
+    '''Поиск по началу ФИО через индекс (organization_id, lower(fio) text_pattern_ops) с кэшем в памяти контейнера'''
+    key = (organization_id, prefix, limit)
+    now = time.monotonic()
+    cached = _typeahead_cache.get(key)
+    
+    if cached and cached[0] > now:
+        _typeahead_cache.move_to_end(key)
+        return cached[1]
+    
+    import psycopg2
+    
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    
+    pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    cur.execute("""
+        SELECT id, fio, email, role, organization_id
+        FROM t_p80499285_psot_realization_pro.users
+        WHERE organization_id = %s AND lower(fio) LIKE %s
+        ORDER BY lower(fio)
+        LIMIT %s
+    """, (organization_id, pattern, limit))
+    
+    users = [{
+        'id': row[0],
+        'fio': row[1],
+        'email': row[2] or '',
+        'role': row[3] or 'user',
+        'organization_id': row[4]
+    } for row in cur.fetchall()]
+    
+    cur.close()
+    conn.close()
+    
+    _typeahead_cache[key] = (now + TYPEAHEAD_CACHE_TTL, users)
+    if len(_typeahead_cache) > TYPEAHEAD_CACHE_SIZE:
+        _typeahead_cache.popitem(last=False)
+    
+    return users
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Получить список пользователей организации для выпадающего списка
-    Args: event - dict с httpMethod, queryStringParameters (organization_id)
+    Args: event - dict с httpMethod, queryStringParameters (organization_id; q и limit для поиска по началу ФИО)
           context - object с атрибутами: request_id, function_name
     Returns: HTTP response dict со списком пользователей (id, fio)
     '''
@@ -40,6 +90,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'organization_id required'})
             }
         
+        if 'q' in params:
+            prefix = (params.get('q') or '').strip().lower()
+            limit = min(int(params.get('limit') or TYPEAHEAD_DEFAULT_LIMIT), TYPEAHEAD_MAX_LIMIT)
+            users = search_users_by_prefix(int(organization_id), prefix, limit)
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'users': users})
+            }
+        
         conn = psycopg2.connect(os.environ['DATABASE_URL'])
         cur = conn.cursor()
         
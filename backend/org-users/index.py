@@ -1,11 +1,15 @@
 import json
 import os
+from datetime import datetime
 from typing import Dict, Any
 
+MAX_PAGE_SIZE = 500
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Get organization users with activity statistics
     Args: event - dict with httpMethod, queryStringParameters
+                  (organization_id, optional limit and cursor for keyset pagination)
           context - object with attributes: request_id, function_name
     Returns: HTTP response dict with users list and activity stats
     '''
@@ -40,37 +44,72 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'organization_id required'})
             }
         
+        limit = params.get('limit')
+        cursor = params.get('cursor')
+        
+        keyset_sql = ''
+        limit_sql = ''
+        values = [organization_id]
+        
+        try:
+            if cursor:
+                cursor_created_at, cursor_id = cursor.rsplit('|', 1)
+                keyset_sql = 'AND (u.created_at, u.id) < (%s::timestamp, %s)'
+                values.extend([datetime.fromisoformat(cursor_created_at), int(cursor_id)])
+            
+            if limit:
+                page_size = min(int(limit), MAX_PAGE_SIZE)
+                if page_size < 1:
+                    raise ValueError('limit должен быть положительным')
+                limit_sql = 'LIMIT %s'
+                values.append(page_size)
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': 'invalid limit or cursor'})
+            }
+        
         conn = psycopg2.connect(os.environ['DATABASE_URL'])
         cur = conn.cursor()
         
-        cur.execute("""
+        cur.execute(f"""
+            WITH page AS (
+                SELECT u.id, u.email, u.fio, u.subdivision, u.position, u.role, u.created_at
+                FROM t_p80499285_psot_realization_pro.users u
+                WHERE u.organization_id = %s {keyset_sql}
+                ORDER BY u.created_at DESC, u.id DESC
+                {limit_sql}
+            )
             SELECT 
-                u.id, 
-                u.email, 
-                u.fio, 
-                u.subdivision, 
-                u.position, 
-                u.role, 
-                u.created_at,
-                COALESCE(
-                    (SELECT COUNT(*) FROM t_p80499285_psot_realization_pro.pab_records WHERE user_id = u.id), 
-                    0
-                ) as records_count,
-                COALESCE(
-                    (SELECT COUNT(*) FROM t_p80499285_psot_realization_pro.user_activity WHERE user_id = u.id AND activity_date >= CURRENT_DATE - INTERVAL '30 days'), 
-                    0
-                ) as activities_last_month,
-                COALESCE(
-                    (SELECT MAX(activity_date) FROM t_p80499285_psot_realization_pro.user_activity WHERE user_id = u.id), 
-                    NULL
-                ) as last_activity
-            FROM t_p80499285_psot_realization_pro.users u
-            WHERE u.organization_id = %s
-            ORDER BY u.created_at DESC
-        """, (organization_id,))
+                p.id, 
+                p.email, 
+                p.fio, 
+                p.subdivision, 
+                p.position, 
+                p.role, 
+                p.created_at,
+                COALESCE(s.pab_total, 0) as records_count,
+                COALESCE(a.activities, 0) as activities_last_month,
+                s.last_activity_date as last_activity
+            FROM page p
+            LEFT JOIN t_p80499285_psot_realization_pro.user_stats s ON s.user_id = p.id
+            LEFT JOIN (
+                SELECT d.user_id, SUM(d.count) as activities
+                FROM t_p80499285_psot_realization_pro.user_activity_daily d
+                WHERE d.user_id IN (SELECT id FROM page) AND d.day >= CURRENT_DATE - 30
+                GROUP BY d.user_id
+            ) a ON a.user_id = p.id
+            ORDER BY p.created_at DESC, p.id DESC
+        """, values)
         
+        rows = cur.fetchall()
         users = []
-        for row in cur.fetchall():
+        for row in rows:
             users.append({
                 'id': row[0],
                 'email': row[1],
@@ -80,13 +119,28 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'role': row[5],
                 'created_at': row[6].isoformat() if row[6] else None,
                 'records_count': row[7],
-                'activities_last_month': row[8],
+                'activities_last_month': int(row[8]),
                 'last_activity': row[9].isoformat() if row[9] else None
             })
         
         cur.close()
         conn.close()
         
+        if limit:
+            next_cursor = None
+            if rows and len(rows) == values[-1] and rows[-1][6]:
+                next_cursor = f"{rows[-1][6].isoformat()}|{rows[-1][0]}"
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'users': users, 'next_cursor': next_cursor})
+            }
+        
         return {
             'statusCode': 200,
             'headers': {
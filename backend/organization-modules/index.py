@@ -3,6 +3,17 @@ import os
 import psycopg2
 from typing import Dict, Any
 
+def bump_entitlements_version(cur, organization_id) -> None:
+    '''Новая версия прав предприятия: документ пересчитает entitlements при следующем запросе'''
+    cur.execute('''
+        INSERT INTO t_p80499285_psot_realization_pro.organization_entitlements (organization_id, version)
+        VALUES (%s, 1)
+        ON CONFLICT (organization_id) DO UPDATE
+        SET version = organization_entitlements.version + 1,
+            document = NULL,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (organization_id,))
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     API управления модулями организации
@@ -98,6 +109,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             DO UPDATE SET is_enabled = EXCLUDED.is_enabled
         ''', (organization_id, module_id, is_enabled))
         
+        bump_entitlements_version(cur, organization_id)
         conn.commit()
         cur.close()
         conn.close()
@@ -124,16 +136,27 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        cur.execute('UPDATE t_p80499285_psot_realization_pro.organization_modules SET is_enabled = false WHERE organization_id = %s', (organization_id,))
+        module_ids = list({int(module_id) for module_id in module_ids})
+        
+        # Меняем только строки, которые отличаются от запрошенного набора
+        cur.execute('''
+            UPDATE t_p80499285_psot_realization_pro.organization_modules
+            SET is_enabled = false
+            WHERE organization_id = %s AND is_enabled IS DISTINCT FROM false AND module_id <> ALL(%s::int[])
+        ''', (organization_id, module_ids))
+        changed = cur.rowcount
         
-        for module_id in module_ids:
-            cur.execute('''
-                INSERT INTO t_p80499285_psot_realization_pro.organization_modules (organization_id, module_id, is_enabled)
-                VALUES (%s, %s, true)
-                ON CONFLICT (organization_id, module_id) 
-                DO UPDATE SET is_enabled = true
-            ''', (organization_id, module_id))
+        cur.execute('''
+            INSERT INTO t_p80499285_psot_realization_pro.organization_modules (organization_id, module_id, is_enabled)
+            SELECT %s, requested.module_id, true FROM unnest(%s::int[]) AS requested(module_id)
+            ON CONFLICT (organization_id, module_id)
+            DO UPDATE SET is_enabled = true
+            WHERE organization_modules.is_enabled IS DISTINCT FROM true
+        ''', (organization_id, module_ids))
+        changed += cur.rowcount
         
+        if changed:
+            bump_entitlements_version(cur, organization_id)
         conn.commit()
         cur.close()
         conn.close()
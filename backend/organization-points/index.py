@@ -1,20 +1,418 @@
 import json
 import os
 import psycopg2
-from typing import Dict, Any
+from psycopg2.extras import execute_values
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+from datetime import datetime
+
+LEDGER_PAGE_SIZE = 50
+MAX_LEDGER_PAGE_SIZE = 200
+
+COMPACT_LOCK_KEY = 804992850047
+COMPACT_BATCH_SIZE = 5000
+
+MAX_DEBIT_BATCH = 5000
+
+RECONCILE_LOCK_KEY = 804992850046
+RECONCILE_CHUNK_SIZE = 500
+RECONCILE_WORKERS = 4
+RECONCILE_REPORT_LIMIT = 1000
+
+# Балансы по журналу для диапазона предприятий и расхождения с сохранёнными счётчиками
+DRIFT_SQL = """
+    WITH ledger AS (
+        SELECT organization_id,
+               SUM(points_amount) as balance,
+               COALESCE(SUM(points_amount) FILTER (WHERE points_amount > 0), 0) as earned,
+               COALESCE(-SUM(points_amount) FILTER (WHERE points_amount < 0), 0) as spent
+        FROM t_p80499285_psot_realization_pro.points_history
+        WHERE organization_id BETWEEN %(low)s AND %(high)s AND NOT pending
+        GROUP BY organization_id
+    ), stored AS (
+        SELECT organization_id, points_balance, total_earned, total_spent
+        FROM t_p80499285_psot_realization_pro.organization_points
+        WHERE organization_id BETWEEN %(low)s AND %(high)s
+    )
+    SELECT COALESCE(s.organization_id, l.organization_id),
+           s.points_balance, s.total_earned, s.total_spent,
+           COALESCE(l.balance, 0), COALESCE(l.earned, 0), COALESCE(l.spent, 0)
+    FROM stored s
+    FULL JOIN ledger l ON l.organization_id = s.organization_id
+    WHERE s.organization_id IS NULL
+       OR (COALESCE(s.points_balance, 0), COALESCE(s.total_earned, 0), COALESCE(s.total_spent, 0))
+          IS DISTINCT FROM (COALESCE(l.balance, 0), COALESCE(l.earned, 0), COALESCE(l.spent, 0))
+    ORDER BY 1
+"""
+
+# Пересчёт выполняется после блокировки строк балансов, поэтому видит все зафиксированные начисления
+REPAIR_SQL = """
+    WITH ledger AS (
+        SELECT organization_id,
+               SUM(points_amount) as balance,
+               COALESCE(SUM(points_amount) FILTER (WHERE points_amount > 0), 0) as earned,
+               COALESCE(-SUM(points_amount) FILTER (WHERE points_amount < 0), 0) as spent
+        FROM t_p80499285_psot_realization_pro.points_history
+        WHERE organization_id = ANY(%(ids)s) AND NOT pending
+        GROUP BY organization_id
+    )
+    INSERT INTO t_p80499285_psot_realization_pro.organization_points
+    (organization_id, points_balance, total_earned, total_spent, is_enabled)
+    SELECT target.id, COALESCE(l.balance, 0), COALESCE(l.earned, 0), COALESCE(l.spent, 0), false
+    FROM unnest(%(ids)s::int[]) AS target(id)
+    LEFT JOIN ledger l ON l.organization_id = target.id
+    ON CONFLICT (organization_id) DO UPDATE
+    SET points_balance = EXCLUDED.points_balance,
+        total_earned = EXCLUDED.total_earned,
+        total_spent = EXCLUDED.total_spent,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE (organization_points.points_balance, organization_points.total_earned, organization_points.total_spent)
+          IS DISTINCT FROM (EXCLUDED.points_balance, EXCLUDED.total_earned, EXCLUDED.total_spent)
+"""
+
+# Перенос пачки ожидающих записей в контрольную точку баланса и помесячные итоги одним запросом;
+# незафиксированные вставки не видны и останутся pending до следующего прогона
+COMPACT_SQL = """
+    WITH batch AS (
+        SELECT id FROM t_p80499285_psot_realization_pro.points_history
+        WHERE pending AND (%(org_ids)s::int[] IS NULL OR organization_id = ANY(%(org_ids)s))
+        ORDER BY id
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ), rolled AS (
+        UPDATE t_p80499285_psot_realization_pro.points_history h
+        SET pending = false
+        FROM batch
+        WHERE h.id = batch.id
+        RETURNING h.organization_id, h.points_amount, h.operation_type, h.created_at
+    ), balances AS (
+        UPDATE t_p80499285_psot_realization_pro.organization_points op
+        SET points_balance = op.points_balance + t.amount,
+            total_earned = op.total_earned + t.earned,
+            total_spent = op.total_spent + t.spent,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT organization_id,
+                   SUM(points_amount) as amount,
+                   COALESCE(SUM(points_amount) FILTER (WHERE points_amount > 0), 0) as earned,
+                   COALESCE(-SUM(points_amount) FILTER (WHERE points_amount < 0), 0) as spent
+            FROM rolled
+            GROUP BY organization_id
+        ) t
+        WHERE op.organization_id = t.organization_id
+        RETURNING op.organization_id
+    ), summary AS (
+        INSERT INTO t_p80499285_psot_realization_pro.points_monthly_summary
+        (organization_id, month, operation_type, earned, spent, operations_count)
+        SELECT organization_id, date_trunc('month', created_at)::date, operation_type,
+               COALESCE(SUM(points_amount) FILTER (WHERE points_amount > 0), 0),
+               COALESCE(-SUM(points_amount) FILTER (WHERE points_amount < 0), 0),
+               COUNT(*)
+        FROM rolled
+        GROUP BY 1, 2, 3
+        ON CONFLICT (organization_id, month, operation_type) DO UPDATE
+        SET earned = points_monthly_summary.earned + EXCLUDED.earned,
+            spent = points_monthly_summary.spent + EXCLUDED.spent,
+            operations_count = points_monthly_summary.operations_count + EXCLUDED.operations_count,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT (SELECT COUNT(*) FROM rolled), (SELECT COUNT(*) FROM balances)
+"""
+
+# Списание одним условным UPDATE: остаток проверяется и уменьшается атомарно, строка баланса
+# блокируется только до конца транзакции; запись журнала и итоги месяца - в том же запросе
+DEBIT_SQL = """
+    WITH req(organization_id, amount, operation_type, description) AS (
+        VALUES %s
+    ), debited AS (
+        UPDATE t_p80499285_psot_realization_pro.organization_points op
+        SET points_balance = op.points_balance - req.amount,
+            total_spent = op.total_spent + req.amount,
+            updated_at = CURRENT_TIMESTAMP
+        FROM req
+        WHERE op.organization_id = req.organization_id AND op.points_balance >= req.amount
+        RETURNING op.organization_id, op.points_balance, req.amount, req.operation_type, req.description
+    ), history AS (
+        INSERT INTO t_p80499285_psot_realization_pro.points_history
+        (organization_id, points_amount, operation_type, description)
+        SELECT organization_id, -amount, operation_type, description FROM debited
+    ), summary AS (
+        INSERT INTO t_p80499285_psot_realization_pro.points_monthly_summary
+        (organization_id, month, operation_type, spent, operations_count)
+        SELECT organization_id, date_trunc('month', CURRENT_TIMESTAMP)::date, operation_type, SUM(amount), COUNT(*)
+        FROM debited
+        GROUP BY organization_id, operation_type
+        ON CONFLICT (organization_id, month, operation_type) DO UPDATE
+        SET spent = points_monthly_summary.spent + EXCLUDED.spent,
+            operations_count = points_monthly_summary.operations_count + EXCLUDED.operations_count,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT organization_id, points_balance FROM debited
+"""
 
 def get_db_connection():
     """Создает подключение к базе данных"""
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn)
 
+def apply_points_summary(cur, org_id: int, operation_type: str, points_amount: float, created_at: datetime) -> None:
+    """Обновление помесячных итогов начислений и списаний в той же транзакции, что и запись истории"""
+    cur.execute("""
+        INSERT INTO t_p80499285_psot_realization_pro.points_monthly_summary
+        (organization_id, month, operation_type, earned, spent, operations_count)
+        VALUES (%s, date_trunc('month', %s::timestamp)::date, %s, %s, %s, 1)
+        ON CONFLICT (organization_id, month, operation_type) DO UPDATE
+        SET earned = points_monthly_summary.earned + EXCLUDED.earned,
+            spent = points_monthly_summary.spent + EXCLUDED.spent,
+            operations_count = points_monthly_summary.operations_count + 1,
+            updated_at = CURRENT_TIMESTAMP
+    """, (org_id, created_at, operation_type, max(points_amount, 0), max(-points_amount, 0)))
+
+def get_ledger(cur, org_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Журнал операций с курсором created_at|id и фильтрами по периоду и типу операции"""
+    filters = ['organization_id = %s']
+    values: List[Any] = [org_id]
+    
+    if params.get('from'):
+        filters.append('created_at >= %s::timestamp')
+        values.append(params['from'])
+    
+    if params.get('to'):
+        filters.append('created_at < %s::timestamp')
+        values.append(params['to'])
+    
+    if params.get('operation_type'):
+        filters.append('operation_type = %s')
+        values.append(params['operation_type'])
+    
+    if params.get('cursor'):
+        cursor_created_at, cursor_id = params['cursor'].rsplit('|', 1)
+        filters.append('(created_at, id) < (%s::timestamp, %s)')
+        values.extend([cursor_created_at, int(cursor_id)])
+    
+    limit = min(int(params.get('limit') or LEDGER_PAGE_SIZE), MAX_LEDGER_PAGE_SIZE)
+    values.append(limit)
+    
+    cur.execute(f"""
+        SELECT id, points_amount, operation_type, description, created_at
+        FROM t_p80499285_psot_realization_pro.points_history
+        WHERE {' AND '.join(filters)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, values)
+    rows = cur.fetchall()
+    
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = f"{rows[-1][4].isoformat()}|{rows[-1][0]}"
+    
+    return {
+        'items': [{
+            'id': row[0],
+            'points_amount': float(row[1]),
+            'operation_type': row[2],
+            'description': row[3],
+            'created_at': row[4].isoformat() if row[4] else None
+        } for row in rows],
+        'next_cursor': next_cursor
+    }
+
+def get_monthly_summary(cur, org_id: int, from_month: str, to_month: str) -> Dict[str, Any]:
+    """Выписка за период по помесячным итогам без чтения истории"""
+    filters = ['organization_id = %s']
+    values: List[Any] = [org_id]
+    
+    if from_month:
+        filters.append("month >= date_trunc('month', %s::date)::date")
+        values.append(from_month if len(from_month) > 7 else f'{from_month}-01')
+    
+    if to_month:
+        filters.append("month <= date_trunc('month', %s::date)::date")
+        values.append(to_month if len(to_month) > 7 else f'{to_month}-01')
+    
+    cur.execute(f"""
+        SELECT month, operation_type, earned, spent, operations_count
+        FROM t_p80499285_psot_realization_pro.points_monthly_summary
+        WHERE {' AND '.join(filters)}
+        ORDER BY month DESC, operation_type
+    """, values)
+    
+    months = []
+    totals = {'earned': 0.0, 'spent': 0.0, 'operations_count': 0}
+    for row in cur.fetchall():
+        months.append({
+            'month': row[0].strftime('%Y-%m'),
+            'operation_type': row[1],
+            'earned': float(row[2]),
+            'spent': float(row[3]),
+            'operations_count': row[4]
+        })
+        totals['earned'] += float(row[2])
+        totals['spent'] += float(row[3])
+        totals['operations_count'] += row[4]
+    
+    totals['earned'] = round(totals['earned'], 2)
+    totals['spent'] = round(totals['spent'], 2)
+    return {'months': months, 'totals': totals}
+
+def reconcile_chunk(bounds: Tuple[int, int, bool]) -> Tuple[List[Dict[str, Any]], int]:
+    """Сверка диапазона предприятий с журналом на отдельном соединении; при repair - исправление под блокировкой строк"""
+    low, high, repair = bounds
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(DRIFT_SQL, {'low': low, 'high': high})
+        drift = [{
+            'organization_id': row[0],
+            'stored': None if row[1] is None else {
+                'points_balance': float(row[1]),
+                'total_earned': float(row[2] or 0),
+                'total_spent': float(row[3] or 0)
+            },
+            'ledger': {
+                'points_balance': float(row[4]),
+                'total_earned': float(row[5]),
+                'total_spent': float(row[6])
+            }
+        } for row in cur.fetchall()]
+        
+        repaired = 0
+        if repair and drift:
+            ids = [item['organization_id'] for item in drift]
+            cur.execute("""
+                SELECT organization_id FROM t_p80499285_psot_realization_pro.organization_points
+                WHERE organization_id = ANY(%s)
+                ORDER BY organization_id
+                FOR UPDATE
+            """, (ids,))
+            cur.execute(REPAIR_SQL, {'ids': ids})
+            repaired = cur.rowcount
+            conn.commit()
+        
+        return drift, repaired
+    finally:
+        cur.close()
+        conn.close()
+
+def reconcile_balances(repair: bool) -> Dict[str, Any]:
+    """Параллельная сверка балансов всех предприятий с points_history пачками по диапазонам id"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT pg_try_advisory_lock(%s)', (RECONCILE_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return {'skipped': True}
+        
+        try:
+            cur.execute("SELECT id FROM t_p80499285_psot_realization_pro.organizations ORDER BY id")
+            org_ids = [row[0] for row in cur.fetchall()]
+            chunks = [
+                (org_ids[i], org_ids[min(i + RECONCILE_CHUNK_SIZE, len(org_ids)) - 1], repair)
+                for i in range(0, len(org_ids), RECONCILE_CHUNK_SIZE)
+            ]
+            
+            with ThreadPoolExecutor(max_workers=RECONCILE_WORKERS) as pool:
+                results = list(pool.map(reconcile_chunk, chunks))
+        finally:
+            cur.execute('SELECT pg_advisory_unlock(%s)', (RECONCILE_LOCK_KEY,))
+    finally:
+        cur.close()
+        conn.close()
+    
+    drift = [item for chunk_drift, _ in results for item in chunk_drift]
+    return {
+        'skipped': False,
+        'organizations_checked': len(org_ids),
+        'chunks': len(chunks),
+        'drifted': len(drift),
+        'repaired': sum(repaired for _, repaired in results),
+        'drift': drift[:RECONCILE_REPORT_LIMIT]
+    }
+
+def debit_points(cur, debits: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Атомарные списания (org_id, points): ожидающие записи append_only переносятся в баланс, затем один условный UPDATE"""
+    rows = []
+    rejected = []
+    seen = set()
+    for index, item in enumerate(debits):
+        org_id = item.get('org_id') if isinstance(item, dict) else None
+        points = item.get('points') if isinstance(item, dict) else None
+        if not isinstance(org_id, int) or isinstance(org_id, bool) or not isinstance(points, (int, float)) or isinstance(points, bool) or points <= 0:
+            rejected.append({'index': index, 'org_id': org_id, 'reason': 'org_id и положительное points обязательны'})
+            continue
+        if org_id in seen:
+            rejected.append({'index': index, 'org_id': org_id, 'reason': 'Повторное списание для предприятия в пачке'})
+            continue
+        seen.add(org_id)
+        rows.append((index, org_id, points, item.get('operation_type') or 'debit', item.get('description') or ''))
+    
+    debited = []
+    if rows:
+        org_ids = sorted(seen)
+        cur.execute(COMPACT_SQL, {'org_ids': org_ids, 'limit': None})
+        results = execute_values(
+            cur, DEBIT_SQL,
+            sorted((row[1:] for row in rows), key=lambda row: row[0]),
+            template='(%s::int, %s::numeric, %s::varchar, %s::text)',
+            page_size=len(rows),
+            fetch=True
+        )
+        balances = {org_id: float(balance) for org_id, balance in results}
+        for index, org_id, points, _, _ in rows:
+            if org_id in balances:
+                debited.append({'index': index, 'org_id': org_id, 'points': points, 'new_balance': balances[org_id]})
+            else:
+                rejected.append({'index': index, 'org_id': org_id, 'reason': 'Недостаточно баллов'})
+    
+    return {
+        'debited': debited,
+        'rejected': sorted(rejected, key=lambda item: item['index']),
+        'points_debited': round(sum(item['points'] for item in debited), 2)
+    }
+
+def compact_ledger() -> Dict[str, Any]:
+    """Компактор журнала: пачками переносит ожидающие начисления append_only-предприятий в баланс"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT pg_try_advisory_lock(%s)', (COMPACT_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return {'skipped': True}
+        
+        entries = 0
+        organizations = 0
+        try:
+            while True:
+                cur.execute(COMPACT_SQL, {'org_ids': None, 'limit': COMPACT_BATCH_SIZE})
+                rolled, updated = cur.fetchone()
+                conn.commit()
+                entries += rolled
+                organizations += updated
+                if rolled < COMPACT_BATCH_SIZE:
+                    break
+        finally:
+            conn.rollback()
+            cur.execute('SELECT pg_advisory_unlock(%s)', (COMPACT_LOCK_KEY,))
+    finally:
+        cur.close()
+        conn.close()
+    
+    return {'skipped': False, 'entries_compacted': entries, 'balance_updates': organizations}
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     API для управления баллами предприятий
     GET /?org_id=X - получить баланс баллов предприятия
     POST / - начислить/списать баллы
+    POST / action=debit - атомарное списание (org_id, points, operation_type, description)
+    POST / action=debit_batch - пакетное списание по списку debits, например для счетов billing_run
+    POST / action=compact - перенос ожидающих записей журнала в контрольные точки балансов
+    POST / action=reconcile - сверка балансов всех предприятий с журналом (repair=true - исправить расхождения)
     GET /?org_id=X&history=true - история операций с баллами
-    PUT / - включить/выключить систему баллов для предприятия
+    GET /?org_id=X&ledger=true - журнал с курсором (limit, cursor, from, to, operation_type)
+    GET /?org_id=X&summary=true - итоги по месяцам и типам операций (from_month, to_month в формате YYYY-MM)
+    PUT / - включить/выключить систему баллов и режим append_only для предприятия
+    В режиме append_only начисления только добавляются в журнал; баланс = контрольная точка + ожидающие записи
     """
     method = event.get('httpMethod', 'GET')
     
@@ -31,6 +429,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    if method == 'POST':
+        body = json.loads(event.get('body') or '{}')
+        if body.get('action') in ('reconcile', 'compact'):
+            result = reconcile_balances(bool(body.get('repair'))) if body['action'] == 'reconcile' else compact_ledger()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+    
     conn = get_db_connection()
     cur = conn.cursor()
     
@@ -39,6 +448,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             params = event.get('queryStringParameters') or {}
             org_id = params.get('org_id')
             history = params.get('history', 'false').lower() == 'true'
+            ledger = params.get('ledger', 'false').lower() == 'true'
+            summary = params.get('summary', 'false').lower() == 'true'
             
             if not org_id:
                 return {
@@ -48,12 +459,40 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
+            if ledger:
+                try:
+                    result = get_ledger(cur, int(org_id), params)
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Некорректные limit или cursor'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if summary:
+                result = get_monthly_summary(cur, int(org_id), params.get('from_month'), params.get('to_month'))
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
             if history:
                 cur.execute("""
                     SELECT id, points_amount, operation_type, description, created_at
                     FROM t_p80499285_psot_realization_pro.points_history
                     WHERE organization_id = %s
-                    ORDER BY created_at DESC
+                    ORDER BY created_at DESC, id DESC
                     LIMIT 100
                 """, (org_id,))
                 
@@ -76,9 +515,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             else:
                 cur.execute("""
-                    SELECT id, points_balance, total_earned, total_spent, is_enabled, created_at, updated_at
-                    FROM t_p80499285_psot_realization_pro.organization_points
-                    WHERE organization_id = %s
+                    SELECT op.id,
+                           op.points_balance + COALESCE(p.amount, 0),
+                           op.total_earned + COALESCE(p.earned, 0),
+                           op.total_spent + COALESCE(p.spent, 0),
+                           op.is_enabled, op.created_at, op.updated_at, op.append_only
+                    FROM t_p80499285_psot_realization_pro.organization_points op
+                    LEFT JOIN LATERAL (
+                        SELECT SUM(points_amount) as amount,
+                               SUM(points_amount) FILTER (WHERE points_amount > 0) as earned,
+                               -SUM(points_amount) FILTER (WHERE points_amount < 0) as spent
+                        FROM t_p80499285_psot_realization_pro.points_history
+                        WHERE organization_id = op.organization_id AND pending
+                    ) p ON true
+                    WHERE op.organization_id = %s
                 """, (org_id,))
                 
                 row = cur.fetchone()
@@ -88,7 +538,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         INSERT INTO t_p80499285_psot_realization_pro.organization_points
                         (organization_id, points_balance, total_earned, total_spent, is_enabled)
                         VALUES (%s, 0, 0, 0, false)
-                        RETURNING id, points_balance, total_earned, total_spent, is_enabled, created_at, updated_at
+                        RETURNING id, points_balance, total_earned, total_spent, is_enabled, created_at, updated_at, append_only
                     """, (org_id,))
                     
                     row = cur.fetchone()
@@ -101,7 +551,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'total_spent': float(row[3]) if row[3] else 0,
                     'is_enabled': row[4],
                     'created_at': row[5].isoformat() if row[5] else None,
-                    'updated_at': row[6].isoformat() if row[6] else None
+                    'updated_at': row[6].isoformat() if row[6] else None,
+                    'append_only': row[7]
                 }
                 
                 return {
@@ -113,6 +564,37 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
+            
+            if body.get('action') in ('debit', 'debit_batch'):
+                debits = body.get('debits') if body['action'] == 'debit_batch' else [body]
+                if not isinstance(debits, list) or not debits or len(debits) > MAX_DEBIT_BATCH:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'debits: от 1 до {MAX_DEBIT_BATCH} списаний'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                
+                result = debit_points(cur, debits)
+                conn.commit()
+                
+                if body['action'] == 'debit':
+                    if result['rejected']:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': json.dumps({'error': result['rejected'][0]['reason']}, ensure_ascii=False),
+                            'isBase64Encoded': False
+                        }
+                    result = {'message': 'Баллы списаны', 'new_balance': result['debited'][0]['new_balance']}
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
             org_id = body.get('org_id')
             points_amount = body.get('points_amount', 0)
             operation_type = body.get('operation_type', 'manual')
@@ -126,10 +608,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
+            # Ручная операция меняет контрольную точку; проверка остатка учитывает ожидающие записи журнала
             cur.execute("""
-                SELECT id, points_balance, total_earned, total_spent 
-                FROM t_p80499285_psot_realization_pro.organization_points
-                WHERE organization_id = %s
+                SELECT op.id,
+                       op.points_balance + COALESCE((
+                           SELECT SUM(h.points_amount) FROM t_p80499285_psot_realization_pro.points_history h
+                           WHERE h.organization_id = op.organization_id AND h.pending
+                       ), 0)
+                FROM t_p80499285_psot_realization_pro.organization_points op
+                WHERE op.organization_id = %s
+                FOR UPDATE
             """, (org_id,))
             
             row = cur.fetchone()
@@ -139,13 +627,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     INSERT INTO t_p80499285_psot_realization_pro.organization_points
                     (organization_id, points_balance, total_earned, total_spent, is_enabled)
                     VALUES (%s, 0, 0, 0, true)
-                    RETURNING id, points_balance, total_earned, total_spent
+                    RETURNING id, points_balance
                 """, (org_id,))
                 row = cur.fetchone()
             
             current_balance = float(row[1]) if row[1] else 0
-            total_earned = float(row[2]) if row[2] else 0
-            total_spent = float(row[3]) if row[3] else 0
             
             new_balance = current_balance + points_amount
             
@@ -157,26 +643,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            if points_amount > 0:
-                total_earned += points_amount
-            else:
-                total_spent += abs(points_amount)
-            
             cur.execute("""
                 UPDATE t_p80499285_psot_realization_pro.organization_points
-                SET points_balance = %s, 
-                    total_earned = %s,
-                    total_spent = %s,
+                SET points_balance = points_balance + %s,
+                    total_earned = total_earned + %s,
+                    total_spent = total_spent + %s,
                     updated_at = CURRENT_TIMESTAMP
                 WHERE organization_id = %s
-            """, (new_balance, total_earned, total_spent, org_id))
+            """, (points_amount, max(points_amount, 0), max(-points_amount, 0), org_id))
             
             cur.execute("""
                 INSERT INTO t_p80499285_psot_realization_pro.points_history
                 (organization_id, points_amount, operation_type, description)
                 VALUES (%s, %s, %s, %s)
+                RETURNING created_at
             """, (org_id, points_amount, operation_type, description))
             
+            apply_points_summary(cur, org_id, operation_type, points_amount, cur.fetchone()[0])
+            
             conn.commit()
             
             return {
@@ -193,6 +677,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             body = json.loads(event.get('body', '{}'))
             org_id = body.get('org_id')
             is_enabled = body.get('is_enabled')
+            append_only = body.get('append_only')
             
             if not org_id:
                 return {
@@ -204,11 +689,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             cur.execute("""
                 INSERT INTO t_p80499285_psot_realization_pro.organization_points
-                (organization_id, is_enabled, points_balance, total_earned, total_spent)
-                VALUES (%s, %s, 0, 0, 0)
+                (organization_id, is_enabled, points_balance, total_earned, total_spent, append_only)
+                VALUES (%s, %s, 0, 0, 0, COALESCE(%s, false))
                 ON CONFLICT (organization_id) 
-                DO UPDATE SET is_enabled = EXCLUDED.is_enabled, updated_at = CURRENT_TIMESTAMP
-            """, (org_id, is_enabled))
+                DO UPDATE SET is_enabled = COALESCE(%s, organization_points.is_enabled),
+                              append_only = COALESCE(%s, organization_points.append_only),
+                              updated_at = CURRENT_TIMESTAMP
+            """, (org_id, is_enabled, append_only, is_enabled, append_only))
             
             conn.commit()
             
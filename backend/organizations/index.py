@@ -1,19 +1,285 @@
 import json
 import os
+import hashlib
 import psycopg2
 import secrets
 import string
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Set
 from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+
+MAX_PAGE_SIZE = 200
+MAX_BULK_ORGANIZATIONS = 200
+OVERVIEW_CACHE_TTL = 10
+OVERVIEW_LAST_TRANSACTIONS = 10
+
+_overview_cache: Dict[int, tuple] = {}
+
+OVERVIEW_SQL = '''
+    SELECT json_build_object(
+        'organization', (
+            SELECT row_to_json(o) FROM (
+                SELECT id, name, registration_code, created_at, trial_end_date,
+                       subscription_type, is_active, is_blocked, logo_url
+                FROM t_p80499285_psot_realization_pro.organizations
+                WHERE id = %(org_id)s
+            ) o
+        ),
+        'points', (
+            SELECT row_to_json(p) FROM (
+                SELECT op.points_balance + COALESCE(SUM(h.points_amount), 0) as points_balance,
+                       op.total_earned + COALESCE(SUM(h.points_amount) FILTER (WHERE h.points_amount > 0), 0) as total_earned,
+                       op.total_spent + COALESCE(-SUM(h.points_amount) FILTER (WHERE h.points_amount < 0), 0) as total_spent,
+                       op.is_enabled
+                FROM t_p80499285_psot_realization_pro.organization_points op
+                LEFT JOIN t_p80499285_psot_realization_pro.points_history h
+                    ON h.organization_id = op.organization_id AND h.pending
+                WHERE op.organization_id = %(org_id)s
+                GROUP BY op.organization_id, op.points_balance, op.total_earned, op.total_spent, op.is_enabled
+            ) p
+        ),
+        'last_transactions', COALESCE((
+            SELECT json_agg(h) FROM (
+                SELECT id, points_amount, operation_type, description, created_at
+                FROM t_p80499285_psot_realization_pro.points_history
+                WHERE organization_id = %(org_id)s
+                ORDER BY created_at DESC
+                LIMIT %(last_transactions)s
+            ) h
+        ), '[]'::json),
+        'modules', COALESCE((
+            SELECT json_agg(m ORDER BY m.name) FROM (
+                SELECT m.id, m.name, m.description, m.module_type, m.is_active, om.id IS NOT NULL as enabled
+                FROM t_p80499285_psot_realization_pro.modules m
+                LEFT JOIN t_p80499285_psot_realization_pro.organization_modules om
+                    ON om.module_id = m.id AND om.organization_id = %(org_id)s
+                WHERE m.is_active = true
+            ) m
+        ), '[]'::json),
+        'pages', COALESCE((
+            SELECT json_agg(pg ORDER BY pg.name) FROM (
+                SELECT p.id, p.name, p.route, p.icon, p.description, p.is_active, op.id IS NOT NULL as enabled
+                FROM t_p80499285_psot_realization_pro.pages p
+                LEFT JOIN t_p80499285_psot_realization_pro.organization_pages op
+                    ON op.page_id = p.id AND op.organization_id = %(org_id)s
+                WHERE p.is_active = true
+            ) pg
+        ), '[]'::json),
+        'users_by_role', COALESCE((
+            SELECT json_object_agg(role, user_count)
+            FROM t_p80499285_psot_realization_pro.user_role_counts
+            WHERE organization_id = %(org_id)s AND user_count > 0
+        ), '{}'::json),
+        'pab_last_30_days', (
+            SELECT json_build_object('records', COUNT(DISTINCT r.id), 'observations', COUNT(ob.id))
+            FROM t_p80499285_psot_realization_pro.users u
+            JOIN t_p80499285_psot_realization_pro.pab_records r ON r.user_id = u.id
+            LEFT JOIN t_p80499285_psot_realization_pro.pab_observations ob ON ob.pab_record_id = r.id
+            WHERE u.organization_id = %(org_id)s AND r.doc_date >= CURRENT_DATE - 30
+        )
+    )
+'''
 
 def generate_registration_code() -> str:
     return ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(10))
 
+def generate_registration_codes(cur, count: int) -> List[str]:
+    '''Пачка уникальных кодов: одна проверка коллизий на всю пачку, повтор только для совпавших'''
+    codes: Set[str] = set()
+    while len(codes) < count:
+        candidates = set()
+        while len(candidates) < count - len(codes):
+            candidates.add(generate_registration_code())
+        candidates -= codes
+        cur.execute(
+            'SELECT registration_code FROM t_p80499285_psot_realization_pro.organizations WHERE registration_code = ANY(%s)',
+            (list(candidates),)
+        )
+        codes |= candidates - {row[0] for row in cur.fetchall()}
+    return list(codes)
+
+def get_organization_overview(org_id: int):
+    '''Сводка по предприятию одним запросом: подзапросы собираются в JSON на стороне БД, результат кэшируется на несколько секунд'''
+    now = time.monotonic()
+    cached = _overview_cache.get(org_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    
+    conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    cur = conn.cursor()
+    cur.execute(OVERVIEW_SQL, {'org_id': org_id, 'last_transactions': OVERVIEW_LAST_TRANSACTIONS})
+    overview = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    
+    if not overview['organization']:
+        return None
+    
+    overview['organization']['user_count'] = sum(overview['users_by_role'].values())
+    overview['points'] = overview['points'] or {
+        'points_balance': 0,
+        'total_earned': 0,
+        'total_spent': 0,
+        'is_enabled': False
+    }
+    
+    _overview_cache[org_id] = (now + OVERVIEW_CACHE_TTL, overview)
+    return overview
+
+def bump_entitlements_version(cur, organization_id) -> None:
+    '''Новая версия прав предприятия: документ пересчитает entitlements при следующем запросе'''
+    cur.execute('''
+        INSERT INTO t_p80499285_psot_realization_pro.organization_entitlements (organization_id, version)
+        VALUES (%s, 1)
+        ON CONFLICT (organization_id) DO UPDATE
+        SET version = organization_entitlements.version + 1,
+            document = NULL,
+            updated_at = CURRENT_TIMESTAMP
+    ''', (organization_id,))
+
+def bulk_onboard(cur, items: List[Dict[str, Any]], base_url: str) -> List[Dict[str, Any]]:
+    '''Создание пачки предприятий с модулями и администраторами мульти-строчными вставками в одной транзакции'''
+    for item in items:
+        if not (item.get('name') or '').strip():
+            raise ValueError('Missing name')
+    
+    admin_emails = [
+        admin['email'].strip().lower()
+        for item in items for admin in item.get('admins') or []
+        if (admin.get('email') or '').strip()
+    ]
+    if len(admin_emails) != len(set(admin_emails)):
+        raise ValueError('Duplicate admin email in request')
+    if admin_emails:
+        cur.execute(
+            'SELECT email FROM t_p80499285_psot_realization_pro.users WHERE lower(email) = ANY(%s)',
+            (admin_emails,)
+        )
+        existing = [row[0] for row in cur.fetchall()]
+        if existing:
+            raise ValueError(f"Email уже существует: {', '.join(existing)}")
+    
+    plan_ids = list({int(item['subscription_plan_id']) for item in items if item.get('subscription_plan_id')})
+    plans = {}
+    if plan_ids:
+        cur.execute(
+            'SELECT id, trial_days, name FROM t_p80499285_psot_realization_pro.subscription_plans WHERE id = ANY(%s)',
+            (plan_ids,)
+        )
+        plans = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    
+    codes = generate_registration_codes(cur, len(items))
+    now = datetime.now()
+    org_rows = []
+    for item, code in zip(items, codes):
+        trial_end_date = None
+        subscription_type = 'free'
+        plan = plans.get(int(item['subscription_plan_id'])) if item.get('subscription_plan_id') else None
+        if plan:
+            trial_end_date = now + timedelta(days=plan[0] or 0)
+            subscription_type = plan[1]
+        item['_code'] = code
+        item['_subscription_type'] = subscription_type
+        org_rows.append((
+            item['name'].strip(),
+            code,
+            trial_end_date,
+            subscription_type,
+            item.get('logo_url'),
+            int(item['tariff_plan_id']) if item.get('tariff_plan_id') else None
+        ))
+    
+    created = execute_values(cur, '''
+        INSERT INTO t_p80499285_psot_realization_pro.organizations
+        (name, registration_code, trial_end_date, subscription_type, logo_url, tariff_plan_id)
+        VALUES %s
+        RETURNING id, registration_code
+    ''', org_rows, fetch=True)
+    org_ids = {code: org_id for org_id, code in created}
+    
+    tariff_pairs = [(org_ids[item['_code']], int(item['tariff_plan_id'])) for item in items if item.get('tariff_plan_id')]
+    if tariff_pairs:
+        cur.execute('''
+            INSERT INTO t_p80499285_psot_realization_pro.organization_modules (organization_id, module_id, is_enabled)
+            SELECT t.organization_id, tm.module_id, true
+            FROM unnest(%s::int[], %s::int[]) AS t(organization_id, tariff_id)
+            JOIN t_p80499285_psot_realization_pro.tariff_modules tm ON tm.tariff_id = t.tariff_id
+            ON CONFLICT (organization_id, module_id) DO NOTHING
+        ''', ([pair[0] for pair in tariff_pairs], [pair[1] for pair in tariff_pairs]))
+    
+    module_rows = list({
+        (org_ids[item['_code']], int(module_id))
+        for item in items for module_id in item.get('module_ids') or []
+    })
+    if module_rows:
+        execute_values(cur, '''
+            INSERT INTO t_p80499285_psot_realization_pro.organization_modules (organization_id, module_id, is_enabled)
+            VALUES %s
+            ON CONFLICT (organization_id, module_id) DO NOTHING
+        ''', module_rows, template='(%s, %s, true)')
+    
+    admin_rows = []
+    login_links: Dict[str, List[Dict[str, str]]] = {}
+    for item in items:
+        for admin in item.get('admins') or []:
+            email = (admin.get('email') or '').strip()
+            if not email:
+                continue
+            temp_password = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(12))
+            admin_rows.append((
+                email,
+                hashlib.sha256(temp_password.encode()).hexdigest(),
+                admin.get('fio') or '',
+                item['name'].strip(),
+                admin.get('subdivision') or '',
+                admin.get('position') or '',
+                'admin',
+                org_ids[item['_code']]
+            ))
+            login_links.setdefault(item['_code'], []).append({
+                'email': email,
+                'loginLink': f"{base_url}/org/{item['_code']}?email={email}&password={temp_password}"
+            })
+    
+    if admin_rows:
+        user_ids = execute_values(cur, '''
+            INSERT INTO t_p80499285_psot_realization_pro.users
+            (email, password_hash, fio, company, subdivision, position, role, organization_id)
+            VALUES %s
+            RETURNING id
+        ''', admin_rows, fetch=True)
+        execute_values(cur, '''
+            INSERT INTO t_p80499285_psot_realization_pro.user_stats (user_id, registered_count)
+            VALUES %s
+            ON CONFLICT (user_id) DO NOTHING
+        ''', [(row[0],) for row in user_ids], template='(%s, 1)')
+        
+        admin_counts: Dict[int, int] = {}
+        for row in admin_rows:
+            admin_counts[row[7]] = admin_counts.get(row[7], 0) + 1
+        execute_values(cur, '''
+            INSERT INTO t_p80499285_psot_realization_pro.user_role_counts (organization_id, role, user_count)
+            VALUES %s
+            ON CONFLICT (organization_id, role) DO UPDATE
+            SET user_count = user_role_counts.user_count + EXCLUDED.user_count,
+                updated_at = CURRENT_TIMESTAMP
+        ''', sorted(admin_counts.items()), template="(%s, 'admin', %s)")
+    
+    return [{
+        'id': org_ids[item['_code']],
+        'name': item['name'].strip(),
+        'registration_code': item['_code'],
+        'subscription_type': item['_subscription_type'],
+        'admins': login_links.get(item['_code'], [])
+    } for item in items]
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Управление организациями (предприятиями)
-    GET - получить все организации
-    POST - создать новую организацию
+    GET ?id=X&view=overview - сводка: баллы, модули, страницы, пользователи по ролям, ПАБ за 30 дней
+    GET - получить все организации (search - поиск по названию, limit и cursor - постраничная выдача)
+    POST - создать новую организацию; action=bulk_onboard - пачка предприятий с модулями и администраторами
     PUT - обновить данные организации
     '''
     method: str = event.get('httpMethod', 'GET')
@@ -31,6 +297,25 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    params = event.get('queryStringParameters', {}) or {}
+    if method == 'GET' and params.get('view') == 'overview' and params.get('id'):
+        overview = get_organization_overview(int(params['id']))
+        
+        if not overview:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Организация не найдена'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(overview, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
     dsn = os.environ.get('DATABASE_URL')
     conn = psycopg2.connect(dsn)
     cur = conn.cursor()
@@ -74,35 +359,92 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
         
+        search = (params.get('search') or '').strip()
+        limit = params.get('limit')
+        cursor = params.get('cursor')
+        
+        try:
+            page_size = min(int(limit), MAX_PAGE_SIZE) if limit else None
+            if page_size is not None and page_size < 1:
+                raise ValueError('limit должен быть положительным')
+            keyset = None
+            if cursor:
+                cursor_created_at, cursor_id = cursor.rsplit('|', 1)
+                keyset = (datetime.fromisoformat(cursor_created_at), int(cursor_id))
+        except ValueError:
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректные limit или cursor'}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        filters = []
+        values = []
+        
         if org_id:
-            safe_org_id = int(org_id)
-            cur.execute(f'''
-                SELECT o.id, o.name, o.registration_code, o.created_at, o.trial_end_date, 
-                       o.subscription_type, o.is_active, o.logo_url,
-                       COUNT(DISTINCT u.id) as user_count,
-                       COUNT(DISTINCT om.module_id) as module_count,
-                       COUNT(DISTINCT op.page_id) as page_count
-                FROM t_p80499285_psot_realization_pro.organizations o
-                LEFT JOIN t_p80499285_psot_realization_pro.users u ON o.id = u.organization_id
-                LEFT JOIN t_p80499285_psot_realization_pro.organization_modules om ON o.id = om.organization_id
-                LEFT JOIN t_p80499285_psot_realization_pro.organization_pages op ON o.id = op.organization_id
-                WHERE o.id = {safe_org_id}
-                GROUP BY o.id
-            ''')
-        else:
-            cur.execute('''
-                SELECT o.id, o.name, o.registration_code, o.created_at, o.trial_end_date, 
-                       o.subscription_type, o.is_active, o.logo_url,
-                       COUNT(DISTINCT u.id) as user_count,
-                       COUNT(DISTINCT om.module_id) as module_count,
-                       COUNT(DISTINCT op.page_id) as page_count
+            filters.append('o.id = %s')
+            values.append(int(org_id))
+        
+        if search:
+            filters.append('o.name ILIKE %s')
+            values.append('%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        
+        total = None
+        if page_size:
+            where_sql = f"WHERE {' AND '.join(filters)}" if filters else ''
+            cur.execute(f'SELECT COUNT(*) FROM t_p80499285_psot_realization_pro.organizations o {where_sql}', values)
+            total = cur.fetchone()[0]
+        
+        if keyset:
+            filters.append('(o.created_at, o.id) < (%s::timestamp, %s)')
+            values.extend(keyset)
+        
+        where_sql = f"WHERE {' AND '.join(filters)}" if filters else ''
+        limit_sql = ''
+        if page_size:
+            limit_sql = 'LIMIT %s'
+            values.append(page_size)
+        
+        # Счётчики считаются отдельными агрегатами только по организациям страницы,
+        # без перемножения строк users x modules x pages
+        cur.execute(f'''
+            WITH page AS (
+                SELECT o.id, o.name, o.registration_code, o.created_at, o.trial_end_date,
+                       o.subscription_type, o.is_active, o.logo_url
                 FROM t_p80499285_psot_realization_pro.organizations o
-                LEFT JOIN t_p80499285_psot_realization_pro.users u ON o.id = u.organization_id
-                LEFT JOIN t_p80499285_psot_realization_pro.organization_modules om ON o.id = om.organization_id
-                LEFT JOIN t_p80499285_psot_realization_pro.organization_pages op ON o.id = op.organization_id
-                GROUP BY o.id
-                ORDER BY o.created_at DESC
-            ''')
+                {where_sql}
+                ORDER BY o.created_at DESC, o.id DESC
+                {limit_sql}
+            )
+            SELECT p.id, p.name, p.registration_code, p.created_at, p.trial_end_date,
+                   p.subscription_type, p.is_active, p.logo_url,
+                   COALESCE(uc.user_count, 0) as user_count,
+                   COALESCE(mc.module_count, 0) as module_count,
+                   COALESCE(pc.page_count, 0) as page_count
+            FROM page p
+            LEFT JOIN (
+                SELECT organization_id, SUM(user_count) as user_count
+                FROM t_p80499285_psot_realization_pro.user_role_counts
+                WHERE organization_id IN (SELECT id FROM page)
+                GROUP BY organization_id
+            ) uc ON uc.organization_id = p.id
+            LEFT JOIN (
+                SELECT organization_id, COUNT(module_id) as module_count
+                FROM t_p80499285_psot_realization_pro.organization_modules
+                WHERE organization_id IN (SELECT id FROM page)
+                GROUP BY organization_id
+            ) mc ON mc.organization_id = p.id
+            LEFT JOIN (
+                SELECT organization_id, COUNT(page_id) as page_count
+                FROM t_p80499285_psot_realization_pro.organization_pages
+                WHERE organization_id IN (SELECT id FROM page)
+                GROUP BY organization_id
+            ) pc ON pc.organization_id = p.id
+            ORDER BY p.created_at DESC, p.id DESC
+        ''', values)
         
         rows = cur.fetchall()
         organizations = []
@@ -117,7 +459,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'subscription_type': row[5],
                 'is_active': row[6],
                 'logo_url': row[7],
-                'user_count': row[8],
+                'user_count': int(row[8]),
                 'module_count': row[9],
                 'page_count': row[10]
             })
@@ -125,6 +467,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         cur.close()
         conn.close()
         
+        if page_size:
+            next_cursor = None
+            if rows and len(rows) == page_size and rows[-1][3]:
+                next_cursor = f"{rows[-1][3].isoformat()}|{rows[-1][0]}"
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'organizations': organizations,
+                    'next_cursor': next_cursor,
+                    'total': total
+                }, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -134,6 +492,44 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     elif method == 'POST':
         body = json.loads(event.get('body', '{}'))
+        
+        if body.get('action') == 'bulk_onboard':
+            items = body.get('organizations') or []
+            
+            if not items or len(items) > MAX_BULK_ORGANIZATIONS:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': f'organizations must contain 1..{MAX_BULK_ORGANIZATIONS} items'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            base_url = (event.get('headers') or {}).get('Origin', 'https://your-domain.com')
+            try:
+                created = bulk_onboard(cur, items, base_url)
+                conn.commit()
+            except ValueError as e:
+                conn.rollback()
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 201,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'organizations': created}, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
         name = body.get('name')
         tariff_plan_id = body.get('tariff_plan_id')
         subscription_plan_id = body.get('subscription_plan_id')
@@ -248,6 +644,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             params.append(org_id)
             query = f"UPDATE organizations SET {', '.join(updates)} WHERE id = %s"
             cur.execute(query, params)
+            if 'subscription_type' in body:
+                bump_entitlements_version(cur, org_id)
             conn.commit()
         
         cur.close()
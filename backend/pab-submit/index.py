@@ -1,6 +1,7 @@
 import json
+import time
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
 import psycopg2
 from io import BytesIO
@@ -14,6 +15,86 @@ from email.mime.base import MIMEBase
 from email import encoders
 import boto3
 
+MODULE_GUARD_TTL = 5
+
+_module_guard_users: Dict[int, tuple] = {}
+_module_guard_modules: Dict[int, tuple] = {}
+
+MODULE_GUARD_SQL = '''
+    SELECT u.organization_id, COALESCE(e.version, 0),
+           CASE WHEN u.organization_id = %(organization_id)s AND COALESCE(e.version, 0) = %(version)s THEN NULL
+                ELSE ARRAY(
+                    SELECT module ->> 'module_type'
+                    FROM jsonb_array_elements(COALESCE(
+                        e.document, t_p80499285_psot_realization_pro.resolve_entitlements(u.organization_id)
+                    ) -> 'modules') module
+                )
+           END
+    FROM t_p80499285_psot_realization_pro.users u
+    LEFT JOIN t_p80499285_psot_realization_pro.organization_entitlements e ON e.organization_id = u.organization_id
+    WHERE u.id = %(user_id)s
+'''
+
+def caller_user_id(event: Dict[str, Any]) -> Optional[int]:
+    '''Идентификатор вызывающего: заголовок X-User-Id, затем user_id в query или JSON-теле'''
+    headers = event.get('headers') or {}
+    raw = headers.get('X-User-Id') or headers.get('x-user-id') or (event.get('queryStringParameters') or {}).get('user_id')
+    if not raw and event.get('body') and not event.get('isBase64Encoded'):
+        try:
+            body = json.loads(event['body'])
+            raw = body.get('user_id') if isinstance(body, dict) else None
+        except ValueError:
+            raw = None
+    try:
+        return int(raw) if raw else None
+    except (TypeError, ValueError):
+        return None
+
+def module_guard_denied(body: Dict[str, Any]) -> Dict[str, Any]:
+    '''Ответ 403 проверки модуля'''
+    return {
+        'statusCode': 403,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(body, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
+
+def require_module(event: Dict[str, Any], module_type: str) -> Optional[Dict[str, Any]]:
+    '''Проверка модуля по документу прав предприятия (organization_entitlements); модули перечитываются только при смене версии. None - доступ разрешён'''
+    user_id = caller_user_id(event)
+    if not user_id:
+        return module_guard_denied({'error': 'Не указан пользователь'})
+    
+    now = time.monotonic()
+    cached = _module_guard_users.get(user_id)
+    if not cached or cached[0] <= now:
+        known = _module_guard_modules.get(cached[1]) if cached else None
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        cur = conn.cursor()
+        try:
+            cur.execute(MODULE_GUARD_SQL, {
+                'user_id': user_id,
+                'organization_id': cached[1] if known else None,
+                'version': known[0] if known else None
+            })
+            row = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        
+        if not row:
+            return module_guard_denied({'error': 'Пользователь не найден'})
+        organization_id, version, modules = row
+        if organization_id and modules is not None:
+            _module_guard_modules[organization_id] = (version, frozenset(modules))
+        cached = (now + MODULE_GUARD_TTL, organization_id)
+        _module_guard_users[user_id] = cached
+    
+    organization_id = cached[1]
+    if not organization_id or module_type in _module_guard_modules[organization_id][1]:
+        return None
+    return module_guard_denied({'error': 'Модуль не подключён для вашего предприятия', 'module': module_type})
+
 def create_word_document(pab_data: Dict) -> BytesIO:
     '''Создание Word документа ПАБ'''
     doc = Document()
@@ -53,6 +134,35 @@ def create_word_document(pab_data: Dict) -> BytesIO:
     
     return file_stream
 
+def apply_pab_stats(cur, user_id: int, observations: list) -> None:
+    '''Инкремент счётчиков user_stats за новый ПАБ без пересчёта по истории'''
+    today = datetime.now().date().isoformat()
+    overdue = sum(1 for obs in observations if obs.get('deadline') and obs['deadline'] < today)
+    in_progress = len(observations) - overdue
+    
+    cur.execute(
+        """INSERT INTO user_stats
+        (user_id, pab_total, pab_in_progress, pab_overdue,
+        observations_issued, observations_in_progress, observations_overdue)
+        VALUES (%s, 1, %s, %s, %s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET
+            pab_total = user_stats.pab_total + EXCLUDED.pab_total,
+            pab_in_progress = user_stats.pab_in_progress + EXCLUDED.pab_in_progress,
+            pab_overdue = user_stats.pab_overdue + EXCLUDED.pab_overdue,
+            observations_issued = user_stats.observations_issued + EXCLUDED.observations_issued,
+            observations_in_progress = user_stats.observations_in_progress + EXCLUDED.observations_in_progress,
+            observations_overdue = user_stats.observations_overdue + EXCLUDED.observations_overdue,
+            updated_at = CURRENT_TIMESTAMP""",
+        (
+            user_id,
+            0 if overdue else 1,
+            1 if overdue else 0,
+            len(observations),
+            in_progress,
+            overdue
+        )
+    )
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Сохранение ПАБ, создание Word документа и отправка email
@@ -71,6 +181,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    denied = require_module(event, 'pab')
+    if denied:
+        return denied
+    
     body = json.loads(event.get('body', '{}'))
     
     dsn = os.environ.get('DATABASE_URL')
@@ -119,6 +233,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             )
         )
     
+    # Обновление счётчиков личного кабинета в той же транзакции
+    if body.get('user_id'):
+        apply_pab_stats(cur, body['user_id'], body['observations'])
+    
     conn.commit()
     
     # Создание Word документа
@@ -1,19 +1,187 @@
+import hashlib
 import json
+import math
 import os
+import time
 import psycopg2
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Dict, Any, List
+
+PLAN_PRICING_TTL = 60
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.json')
+
+def compile_catalog(path: str):
+    """Компиляция каталога компонентов при импорте: неизменяемые цены, готовое тело ответа и ETag"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    
+    prices = MappingProxyType({
+        (component_type, item['name']): float(item['default_price'])
+        for component_type, items in data['components'].items()
+        for item in items
+    })
+    body = json.dumps(data['components'], ensure_ascii=False)
+    etag = f'"catalog-{data["version"]}-{hashlib.sha256(body.encode()).hexdigest()[:12]}"'
+    return prices, body, etag
+
+CATALOG_PRICES, CATALOG_BODY, CATALOG_ETAG = compile_catalog(CATALOG_PATH)
+
+
+_plan_pricing_cache: Dict[int, tuple] = {}
 
 def get_db_connection():
     """Создает подключение к базе данных"""
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn)
 
+def load_plan_pricing(cur, plan_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Загрузка цен планов и их компонентов одним запросом с сохранением в кэш контейнера"""
+    cur.execute("""
+        SELECT sp.id, sp.price, sp.is_points_enabled, sp.points_value,
+               pc.component_type, pc.component_name, pc.price, pc.is_included
+        FROM t_p80499285_psot_realization_pro.subscription_plans sp
+        LEFT JOIN t_p80499285_psot_realization_pro.plan_components pc ON pc.plan_id = sp.id
+        WHERE sp.id = ANY(%s)
+    """, (plan_ids,))
+    
+    plans: Dict[int, Dict[str, Any]] = {}
+    for row in cur.fetchall():
+        plan = plans.setdefault(row[0], {
+            'plan_price': float(row[1] or 0),
+            'is_points_enabled': bool(row[2]),
+            'points_value': float(row[3] or 0),
+            'components': {},
+            'included_total': 0.0
+        })
+        if row[4] is not None:
+            price = float(row[6] or 0)
+            plan['components'][(row[4], row[5])] = (price, bool(row[7]))
+            if row[7]:
+                plan['included_total'] += price
+    
+    expires_at = time.monotonic() + PLAN_PRICING_TTL
+    for plan_id, plan in plans.items():
+        plan['monthly_price'] = plan['included_total'] if plan['components'] else plan['plan_price']
+        _plan_pricing_cache[plan_id] = (expires_at, plan)
+    return plans
+
+def get_plan_pricing(plan_ids: List[int], cur=None) -> Dict[int, Dict[str, Any]]:
+    """Цены планов из кэша; недостающие догружаются одним запросом"""
+    now = time.monotonic()
+    result = {}
+    missing = []
+    for plan_id in plan_ids:
+        cached = _plan_pricing_cache.get(plan_id)
+        if cached and cached[0] > now:
+            result[plan_id] = cached[1]
+        else:
+            missing.append(plan_id)
+    
+    if missing:
+        if cur is None:
+            conn = get_db_connection()
+            try:
+                result.update(load_plan_pricing(conn.cursor(), missing))
+            finally:
+                conn.close()
+        else:
+            result.update(load_plan_pricing(cur, missing))
+    return result
+
+def price_plan(plan_id: int, plan: Dict[str, Any], add: List[Dict[str, Any]] = (), remove: List[Dict[str, Any]] = ()) -> Dict[str, Any]:
+    """Месячная стоимость плана с учётом добавленных и убранных компонентов и её эквивалент в баллах"""
+    monthly_price = plan['monthly_price']
+    adjustments = []
+    
+    for comp in remove:
+        key = (comp.get('component_type'), comp.get('component_name'))
+        price, included = plan['components'].get(key, (0.0, False))
+        if included:
+            monthly_price -= price
+            adjustments.append({'component_type': key[0], 'component_name': key[1], 'price': -price})
+    
+    for comp in add:
+        key = (comp.get('component_type'), comp.get('component_name'))
+        price, included = plan['components'].get(key, (None, False))
+        if included:
+            continue
+        if price is None:
+            price = CATALOG_PRICES.get(key)
+        if price is None:
+            raise ValueError(f'Неизвестный компонент: {key[0]} / {key[1]}')
+        monthly_price += price
+        adjustments.append({'component_type': key[0], 'component_name': key[1], 'price': price})
+    
+    points_price = None
+    if plan['is_points_enabled'] and plan['points_value'] > 0:
+        points_price = math.ceil(round(monthly_price / plan['points_value'], 6))
+    
+    return {
+        'plan_id': plan_id,
+        'monthly_price': round(monthly_price, 2),
+        'points_price': points_price,
+        'adjustments': adjustments
+    }
+
+def run_billing(cur) -> Dict[str, Any]:
+    """Расчёт месячной стоимости всех активных предприятий с одной загрузкой цен на каждый план"""
+    cur.execute("""
+        SELECT o.id, o.name, COALESCE(o.subscription_plan_id, by_name.id)
+        FROM t_p80499285_psot_realization_pro.organizations o
+        LEFT JOIN LATERAL (
+            SELECT sp.id FROM t_p80499285_psot_realization_pro.subscription_plans sp
+            WHERE sp.name = o.subscription_type
+            ORDER BY sp.id
+            LIMIT 1
+        ) by_name ON o.subscription_plan_id IS NULL
+        WHERE o.is_active = true
+        ORDER BY o.id
+    """)
+    organizations = cur.fetchall()
+    plans = get_plan_pricing(list({row[2] for row in organizations if row[2]}), cur)
+    
+    invoices = []
+    total = 0.0
+    for org_id, name, plan_id in organizations:
+        if plan_id not in plans:
+            continue
+        quote = price_plan(plan_id, plans[plan_id])
+        total += quote['monthly_price']
+        invoices.append({
+            'organization_id': org_id,
+            'name': name,
+            'plan_id': plan_id,
+            'monthly_price': quote['monthly_price'],
+            'points_price': quote['points_price']
+        })
+    
+    return {'organizations': invoices, 'total_monthly_price': round(total, 2)}
+
+def bump_entitlements_for_plan(cur, plan_id) -> None:
+    """Новая версия прав у всех предприятий на плане подписки: документы пересчитает entitlements"""
+    cur.execute("""
+        UPDATE t_p80499285_psot_realization_pro.organization_entitlements e
+        SET version = e.version + 1,
+            document = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        FROM t_p80499285_psot_realization_pro.organizations o
+        WHERE o.id = e.organization_id AND (
+            o.subscription_plan_id = %s
+            OR (o.subscription_plan_id IS NULL AND o.subscription_type = (
+                SELECT name FROM t_p80499285_psot_realization_pro.subscription_plans WHERE id = %s
+            ))
+        )
+    """, (plan_id, plan_id))
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     API для работы с компонентами тарифных планов
     GET /?plan_id=X - список компонентов тарифа
     GET / - список всех доступных типов компонентов (блоки, страницы, кнопки, модули)
     POST / - добавить/обновить компоненты тарифа
+    POST / action=quote - стоимость плана (plan_id, add, remove) в рублях и баллах
+    POST / action=billing_run - месячная стоимость всех активных предприятий
     """
     method = event.get('httpMethod', 'GET')
     
@@ -23,13 +191,80 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    params = event.get('queryStringParameters') or {}
+    
+    # Каталог компонентов отдаётся заранее сериализованным, без подключения к БД
+    if method == 'GET' and not params.get('plan_id'):
+        headers = event.get('headers') or {}
+        catalog_headers = {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'ETag': CATALOG_ETAG
+        }
+        
+        if (headers.get('If-None-Match') or headers.get('if-none-match')) == CATALOG_ETAG:
+            return {
+                'statusCode': 304,
+                'headers': catalog_headers,
+                'body': '',
+                'isBase64Encoded': False
+            }
+        
+        return {
+            'statusCode': 200,
+            'headers': catalog_headers,
+            'body': CATALOG_BODY,
+            'isBase64Encoded': False
+        }
+    
+    if method == 'POST':
+        body = json.loads(event.get('body', '{}'))
+        
+        # Котировка обслуживается из кэша цен планов без подключения к БД
+        if body.get('action') == 'quote':
+            if not body.get('plan_id'):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'plan_id обязателен'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            plan_id = int(body['plan_id'])
+            plan = get_plan_pricing([plan_id]).get(plan_id)
+            if not plan:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'План не найден'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            try:
+                quote = price_plan(plan_id, plan, body.get('add') or [], body.get('remove') or [])
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(quote, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+    
     conn = get_db_connection()
     cur = conn.cursor()
     
@@ -62,66 +297,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps(components, ensure_ascii=False),
                     'isBase64Encoded': False
                 }
-            
-            else:
-                available_components = {
-                    'blocks': [
-                        {'name': 'Блок "Герой"', 'default_price': 500},
-                        {'name': 'Блок "О нас"', 'default_price': 300},
-                        {'name': 'Блок "Услуги"', 'default_price': 400},
-                        {'name': 'Блок "Портфолио"', 'default_price': 600},
-                        {'name': 'Блок "Команда"', 'default_price': 350},
-                        {'name': 'Блок "Отзывы"', 'default_price': 450},
-                        {'name': 'Блок "Контакты"', 'default_price': 250},
-                        {'name': 'Блок "FAQ"', 'default_price': 300},
-                        {'name': 'Блок "Прайс"', 'default_price': 400},
-                        {'name': 'Блок "Форма"', 'default_price': 500}
-                    ],
-                    'pages': [
-                        {'name': 'Главная страница', 'default_price': 1000},
-                        {'name': 'Страница каталога', 'default_price': 800},
-                        {'name': 'Страница товара', 'default_price': 600},
-                        {'name': 'Страница корзины', 'default_price': 700},
-                        {'name': 'Страница оформления', 'default_price': 900},
-                        {'name': 'Страница профиля', 'default_price': 500},
-                        {'name': 'Страница блога', 'default_price': 600},
-                        {'name': 'Страница статьи', 'default_price': 400},
-                        {'name': 'Страница контактов', 'default_price': 300}
-                    ],
-                    'buttons': [
-                        {'name': 'Кнопка заказа', 'default_price': 100},
-                        {'name': 'Кнопка "В корзину"', 'default_price': 150},
-                        {'name': 'Кнопка "Купить"', 'default_price': 150},
-                        {'name': 'Кнопка подписки', 'default_price': 100},
-                        {'name': 'Кнопка звонка', 'default_price': 80},
-                        {'name': 'Кнопка WhatsApp', 'default_price': 80},
-                        {'name': 'Кнопка Telegram', 'default_price': 80},
-                        {'name': 'Кнопка Email', 'default_price': 80},
-                        {'name': 'Кнопка скачивания', 'default_price': 100}
-                    ],
-                    'modules': [
-                        {'name': 'Модуль авторизации', 'default_price': 1500},
-                        {'name': 'Модуль оплаты', 'default_price': 2000},
-                        {'name': 'Модуль доставки', 'default_price': 1200},
-                        {'name': 'Модуль поиска', 'default_price': 800},
-                        {'name': 'Модуль фильтров', 'default_price': 900},
-                        {'name': 'Модуль отзывов', 'default_price': 600},
-                        {'name': 'Модуль уведомлений', 'default_price': 700},
-                        {'name': 'Модуль аналитики', 'default_price': 1000},
-                        {'name': 'Модуль CRM', 'default_price': 2500},
-                        {'name': 'Модуль чата', 'default_price': 1800}
-                    ]
-                }
-                
+        
+        elif method == 'POST':
+            if body.get('action') == 'billing_run':
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(available_components, ensure_ascii=False),
+                    'body': json.dumps(run_billing(cur), ensure_ascii=False),
                     'isBase64Encoded': False
                 }
-        
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
+            
             plan_id = body.get('plan_id')
             components = body.get('components', [])
             
@@ -170,7 +355,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 WHERE id = %s
             """, (plan_id, plan_id, plan_id))
             
+            bump_entitlements_for_plan(cur, plan_id)
             conn.commit()
+            _plan_pricing_cache.pop(int(plan_id), None)
             
             return {
                 'statusCode': 200,
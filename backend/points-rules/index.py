@@ -1,19 +1,337 @@
 import json
 import os
 import psycopg2
-from typing import Dict, Any
+from psycopg2.extras import execute_values
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta
+
+MAX_ACCRUAL_BATCH = 5000
+
+SIMULATION_DEFAULT_DAYS = 90
+SIMULATION_REPORT_LIMIT = 1000
+
+_rule_table: Dict[str, Any] = {'version': -1, 'defaults': {}, 'orgs': {}}
 
 def get_db_connection():
     """Создает подключение к базе данных"""
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn)
 
+def compile_rule_table(rules: List[tuple], overrides: List[tuple]) -> Tuple[Dict[str, Tuple[float, str]], Dict[Tuple[int, str], Optional[Tuple[float, str]]]]:
+    """Компиляция правил: значения по умолчанию по action_type и исключения по (предприятие, действие)"""
+    by_action: Dict[str, List[Tuple[int, float, str]]] = {}
+    rule_actions: Dict[int, str] = {}
+    for rule_id, action_type, points_amount, rule_name in rules:
+        by_action.setdefault(action_type, []).append((rule_id, float(points_amount), rule_name))
+        rule_actions[rule_id] = action_type
+    
+    defaults = {action_type: (candidates[0][1], candidates[0][2]) for action_type, candidates in by_action.items()}
+    
+    org_rules: Dict[int, Dict[int, Tuple[Optional[bool], Optional[float]]]] = {}
+    for org_id, rule_id, is_enabled, multiplier in overrides:
+        if rule_id in rule_actions:
+            org_rules.setdefault(org_id, {})[rule_id] = (is_enabled, multiplier)
+    
+    # Первое по id не выключенное правило действия с множителем предприятия; None - начисление выключено
+    orgs: Dict[Tuple[int, str], Optional[Tuple[float, str]]] = {}
+    for org_id, settings in org_rules.items():
+        for action_type in {rule_actions[rule_id] for rule_id in settings}:
+            resolved = None
+            for rule_id, points, rule_name in by_action[action_type]:
+                is_enabled, multiplier = settings.get(rule_id, (None, None))
+                if is_enabled is False:
+                    continue
+                resolved = (points * (1.0 if multiplier is None else float(multiplier)), rule_name)
+                break
+            orgs[(org_id, action_type)] = resolved
+    return defaults, orgs
+
+def refresh_rule_table(cur, version: int) -> None:
+    """Перезагрузка таблицы правил контейнера только при смене версии, которую повышает PUT"""
+    if _rule_table['version'] == version:
+        return
+    
+    cur.execute("""
+        SELECT id, action_type, points_amount, rule_name
+        FROM t_p80499285_psot_realization_pro.points_rules
+        WHERE is_active = true
+        ORDER BY id
+    """)
+    rules = cur.fetchall()
+    
+    cur.execute("""
+        SELECT opr.organization_id, opr.rule_id, opr.is_enabled, opr.multiplier
+        FROM t_p80499285_psot_realization_pro.organization_points_rules opr
+        JOIN t_p80499285_psot_realization_pro.points_rules pr ON pr.id = opr.rule_id
+        WHERE pr.is_active = true
+    """)
+    defaults, orgs = compile_rule_table(rules, cur.fetchall())
+    _rule_table.update(version=version, defaults=defaults, orgs=orgs)
+
+def evaluate_rule(org_id: int, action_type: str) -> Optional[Tuple[float, str]]:
+    """Баллы и название правила для действия предприятия без обращения к БД"""
+    orgs = _rule_table['orgs']
+    key = (org_id, action_type)
+    if key in orgs:
+        return orgs[key]
+    return _rule_table['defaults'].get(action_type)
+
+def load_accrual_columns(cur, np, period_from: datetime, period_to: datetime, organization_id: Optional[int]) -> Dict[str, Any]:
+    """Начисления периода в колоночных массивах: по группе (предприятие, действие) число событий и начисленная сумма"""
+    filters = ['h.points_amount > 0', 'h.created_at >= %s', 'h.created_at < %s']
+    values: List[Any] = [period_from, period_to]
+    if organization_id:
+        filters.append('h.organization_id = %s')
+        values.append(organization_id)
+    
+    # Баллы события зависят только от предприятия и действия, поэтому группировка в БД не теряет точности
+    cur.execute(f"""
+        SELECT h.organization_id, h.operation_type, COUNT(*), SUM(h.points_amount)
+        FROM t_p80499285_psot_realization_pro.points_history h
+        WHERE {' AND '.join(filters)}
+          AND h.operation_type IN (SELECT action_type FROM t_p80499285_psot_realization_pro.points_rules)
+        GROUP BY h.organization_id, h.operation_type
+    """, values)
+    rows = cur.fetchall()
+    
+    actions, action_codes = np.unique(np.array([row[1] for row in rows], dtype=object).astype(str), return_inverse=True)
+    return {
+        'actions': [str(action) for action in actions],
+        'org': np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+        'action': action_codes.astype(np.int64),
+        'count': np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows)),
+        'points': np.fromiter((float(row[3]) for row in rows), dtype=np.float64, count=len(rows))
+    }
+
+def is_number(value: Any) -> bool:
+    """Число JSON: int или float, но не bool"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def simulate_rules(cur, proposal: Dict[str, Any]) -> Dict[str, Any]:
+    """Пересчёт начислений периода по предлагаемым правилам и множителям без записи в БД"""
+    import numpy as np
+    
+    try:
+        period_to = datetime.fromisoformat(proposal['to']) if proposal.get('to') else datetime.now()
+        period_from = datetime.fromisoformat(proposal['from']) if proposal.get('from') else period_to - timedelta(days=SIMULATION_DEFAULT_DAYS)
+    except (TypeError, ValueError):
+        raise ValueError('from и to должны быть в формате ISO 8601')
+    organization_id = proposal.get('org_id')
+    
+    cur.execute("""
+        SELECT id, action_type, points_amount, rule_name, is_active
+        FROM t_p80499285_psot_realization_pro.points_rules
+        ORDER BY id
+    """)
+    rules = {row[0]: list(row) for row in cur.fetchall()}
+    for patch in proposal.get('rules') or []:
+        if not isinstance(patch, dict):
+            raise ValueError('Изменение правила должно быть объектом')
+        rule = rules.get(patch.get('id'))
+        if rule is None:
+            raise ValueError(f"Правило {patch.get('id')} не найдено")
+        if 'points_amount' in patch and not is_number(patch['points_amount']):
+            raise ValueError('points_amount должен быть числом')
+        if 'points_amount' in patch:
+            rule[2] = float(patch['points_amount'])
+        if 'is_active' in patch:
+            rule[4] = bool(patch['is_active'])
+    
+    cur.execute("""
+        SELECT organization_id, rule_id, is_enabled, multiplier
+        FROM t_p80499285_psot_realization_pro.organization_points_rules
+    """)
+    overrides = {(row[0], row[1]): [row[2], row[3]] for row in cur.fetchall()}
+    for patch in proposal.get('overrides') or []:
+        if not isinstance(patch, dict):
+            raise ValueError('Переопределение должно быть объектом')
+        key = (patch.get('org_id'), patch.get('rule_id'))
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in key):
+            raise ValueError('org_id и rule_id должны быть целыми числами')
+        if patch.get('multiplier') is not None and not is_number(patch['multiplier']):
+            raise ValueError('multiplier должен быть числом')
+        if patch.get('is_enabled') is not None and not isinstance(patch['is_enabled'], bool):
+            raise ValueError('is_enabled должен быть true или false')
+        if key[1] not in rules:
+            raise ValueError(f'Правило {key[1]} не найдено')
+        override = overrides.setdefault(key, [None, None])
+        if 'is_enabled' in patch:
+            override[0] = patch['is_enabled']
+        if 'multiplier' in patch:
+            override[1] = patch['multiplier']
+    
+    defaults, orgs = compile_rule_table(
+        [tuple(rule[:4]) for rule in rules.values() if rule[4]],
+        [(key[0], key[1], value[0], value[1]) for key, value in overrides.items()]
+    )
+    columns = load_accrual_columns(cur, np, period_from, period_to, organization_id)
+    actions = columns['actions']
+    action_index = {action: code for code, action in enumerate(actions)}
+    
+    # Баллы за событие: значение действия по умолчанию, затем исключения предприятий через searchsorted по ключу org * n + action
+    unit = np.array([defaults.get(action, (0.0,))[0] for action in actions], dtype=np.float64)[columns['action']]
+    exceptions = [(org_id * len(actions) + action_index[action_type], rule[0] if rule else 0.0)
+                  for (org_id, action_type), rule in orgs.items() if action_type in action_index]
+    if exceptions:
+        exceptions.sort()
+        exception_keys = np.array([item[0] for item in exceptions], dtype=np.int64)
+        exception_points = np.array([item[1] for item in exceptions], dtype=np.float64)
+        keys = columns['org'] * len(actions) + columns['action']
+        positions = np.minimum(np.searchsorted(exception_keys, keys), len(exception_keys) - 1)
+        matched = exception_keys[positions] == keys
+        unit[matched] = exception_points[positions[matched]]
+    
+    proposed = columns['count'] * unit
+    org_ids, org_codes = np.unique(columns['org'], return_inverse=True)
+    current_by_org = np.bincount(org_codes, weights=columns['points'], minlength=len(org_ids))
+    proposed_by_org = np.bincount(org_codes, weights=proposed, minlength=len(org_ids))
+    events_by_org = np.bincount(org_codes, weights=columns['count'], minlength=len(org_ids))
+    delta_by_org = proposed_by_org - current_by_org
+    order = np.argsort(-np.abs(delta_by_org), kind='stable')[:SIMULATION_REPORT_LIMIT]
+    
+    return {
+        'period': {'from': period_from.isoformat(), 'to': period_to.isoformat()},
+        'events': int(columns['count'].sum()),
+        'totals': {
+            'current': round(float(current_by_org.sum()), 2),
+            'proposed': round(float(proposed_by_org.sum()), 2),
+            'delta': round(float(delta_by_org.sum()), 2)
+        },
+        'organizations': [{
+            'organization_id': int(org_ids[i]),
+            'events': int(events_by_org[i]),
+            'current': round(float(current_by_org[i]), 2),
+            'proposed': round(float(proposed_by_org[i]), 2),
+            'delta': round(float(delta_by_org[i]), 2)
+        } for i in order]
+    }
+
+def bump_rules_version(cur) -> None:
+    """Повышение версии правил: контейнеры перезагрузят таблицу при следующем начислении"""
+    cur.execute("""
+        UPDATE t_p80499285_psot_realization_pro.points_rules_state
+        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    """)
+
+def apply_points_summary(cur, rows: List[tuple]) -> None:
+    """Обновление помесячных итогов: строки (organization_id, created_at, operation_type, points_amount)"""
+    totals: Dict[tuple, List[float]] = {}
+    for organization_id, created_at, operation_type, points_amount in rows:
+        key = (organization_id, created_at.date().replace(day=1), operation_type)
+        entry = totals.setdefault(key, [0.0, 0.0, 0])
+        if points_amount > 0:
+            entry[0] += points_amount
+        else:
+            entry[1] += -points_amount
+        entry[2] += 1
+    
+    execute_values(cur, """
+        INSERT INTO t_p80499285_psot_realization_pro.points_monthly_summary
+        (organization_id, month, operation_type, earned, spent, operations_count)
+        VALUES %s
+        ON CONFLICT (organization_id, month, operation_type) DO UPDATE
+        SET earned = points_monthly_summary.earned + EXCLUDED.earned,
+            spent = points_monthly_summary.spent + EXCLUDED.spent,
+            operations_count = points_monthly_summary.operations_count + EXCLUDED.operations_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, [key + tuple(value) for key, value in sorted(totals.items())])
+
+def accrue_batch(cur, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Пакетное начисление: правила в памяти, агрегирование по предприятиям, один UPDATE балансов и мульти-строчная история"""
+    valid = []
+    skipped = []
+    for index, event in enumerate(events):
+        org_id = event.get('org_id') if isinstance(event, dict) else None
+        action_type = event.get('action_type') if isinstance(event, dict) else None
+        if not isinstance(org_id, int) or isinstance(org_id, bool) or not isinstance(action_type, str) or not action_type:
+            skipped.append({'index': index, 'reason': 'org_id и action_type обязательны'})
+            continue
+        try:
+            occurred_at = datetime.fromisoformat(event['occurred_at']) if event.get('occurred_at') else None
+        except (TypeError, ValueError):
+            skipped.append({'index': index, 'reason': 'occurred_at должен быть в формате ISO 8601'})
+            continue
+        user_id = event.get('user_id')
+        valid.append((index, org_id, action_type, user_id if isinstance(user_id, int) and not isinstance(user_id, bool) else None, occurred_at))
+    
+    if not valid:
+        return {'accepted': 0, 'points_added': {}, 'skipped': skipped}
+    
+    org_ids = sorted({event[1] for event in valid})
+    cur.execute("""
+        SELECT op.organization_id, COALESCE((SELECT version FROM t_p80499285_psot_realization_pro.points_rules_state), 0), op.append_only
+        FROM t_p80499285_psot_realization_pro.organization_points op
+        WHERE op.organization_id = ANY(%s) AND op.is_enabled = true
+    """, (org_ids,))
+    enabled_rows = cur.fetchall()
+    enabled_orgs = {row[0] for row in enabled_rows}
+    append_only_orgs = {row[0] for row in enabled_rows if row[2]}
+    if enabled_rows:
+        refresh_rule_table(cur, enabled_rows[0][1])
+    
+    history_rows = []
+    org_totals: Dict[int, float] = {}
+    user_actions: Dict[int, int] = {}
+    for index, org_id, action_type, user_id, occurred_at in valid:
+        if org_id not in enabled_orgs:
+            skipped.append({'index': index, 'reason': 'Баллы для предприятия не включены'})
+            continue
+        rule = evaluate_rule(org_id, action_type)
+        if not rule:
+            skipped.append({'index': index, 'reason': 'Правило не найдено или выключено'})
+            continue
+        points, rule_name = rule
+        org_totals[org_id] = org_totals.get(org_id, 0.0) + points
+        if user_id:
+            user_actions[user_id] = user_actions.get(user_id, 0) + 1
+        history_rows.append((org_id, points, action_type, f'Автоначисление: {rule_name}', occurred_at or datetime.now(), org_id in append_only_orgs))
+    
+    # Предприятия в режиме append_only не трогают строку баланса: записи переносит компактор
+    in_place_totals = sorted((org_id, points) for org_id, points in org_totals.items() if org_id not in append_only_orgs)
+    if in_place_totals:
+        # Строки балансов блокируются в порядке organization_id, чтобы параллельные пачки не взаимоблокировались
+        execute_values(cur, """
+            UPDATE t_p80499285_psot_realization_pro.organization_points op
+            SET points_balance = op.points_balance + v.points,
+                total_earned = op.total_earned + v.points,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v(organization_id, points)
+            WHERE op.organization_id = v.organization_id
+        """, in_place_totals, template='(%s, %s::numeric)')
+    
+    if history_rows:
+        execute_values(cur, """
+            INSERT INTO t_p80499285_psot_realization_pro.points_history
+            (organization_id, points_amount, operation_type, description, created_at, pending)
+            VALUES %s
+        """, history_rows)
+        
+        settled = [(row[0], row[4], row[2], row[1]) for row in history_rows if not row[5]]
+        if settled:
+            apply_points_summary(cur, settled)
+    
+    if user_actions:
+        execute_values(cur, """
+            UPDATE t_p80499285_psot_realization_pro.user_stats s
+            SET total_actions = s.total_actions + v.actions
+            FROM (VALUES %s) AS v(user_id, actions)
+            WHERE s.user_id = v.user_id
+        """, sorted(user_actions.items()))
+    
+    return {
+        'accepted': len(history_rows),
+        'points_added': {str(org_id): round(points, 2) for org_id, points in org_totals.items()},
+        'skipped': sorted(skipped, key=lambda item: item['index'])
+    }
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     API для управления правилами начисления баллов
     GET / - получить все правила
     GET /?org_id=X - получить правила для предприятия
-    POST / - создать новое правило
+    POST / - начислить баллы за действие (org_id, action_type, user_id)
+    POST / action=accrue_batch - пакетное начисление по списку events
+    POST / action=simulate - что будет при изменении правил (rules, overrides) за период from..to, без записи
     PUT / - обновить правило или настройки предприятия
     """
     method = event.get('httpMethod', 'GET')
@@ -102,6 +420,47 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
             
+            if body.get('action') == 'simulate':
+                cur.execute('SET TRANSACTION READ ONLY')
+                try:
+                    result = simulate_rules(cur, body)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                finally:
+                    conn.rollback()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if body.get('action') == 'accrue_batch':
+                events = body.get('events') or []
+                if not isinstance(events, list) or not events or len(events) > MAX_ACCRUAL_BATCH:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'events: от 1 до {MAX_ACCRUAL_BATCH} событий'}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                
+                result = accrue_batch(cur, events)
+                conn.commit()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
             org_id = body.get('org_id')
             action_type = body.get('action_type')
             user_id = body.get('user_id')
@@ -115,8 +474,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             cur.execute("""
-                SELECT op.is_enabled FROM t_p80499285_psot_realization_pro.organization_points
-                WHERE organization_id = %s
+                SELECT op.is_enabled, COALESCE((SELECT version FROM t_p80499285_psot_realization_pro.points_rules_state), 0), op.append_only
+                FROM t_p80499285_psot_realization_pro.organization_points op
+                WHERE op.organization_id = %s
             """, (org_id,))
             
             org_points = cur.fetchone()
@@ -128,20 +488,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute("""
-                SELECT 
-                    pr.points_amount, pr.rule_name,
-                    COALESCE(opr.multiplier, 1.0) as multiplier
-                FROM t_p80499285_psot_realization_pro.points_rules pr
-                LEFT JOIN t_p80499285_psot_realization_pro.organization_points_rules opr
-                    ON pr.id = opr.rule_id AND opr.organization_id = %s
-                WHERE pr.action_type = %s 
-                    AND pr.is_active = true
-                    AND (opr.is_enabled = true OR opr.is_enabled IS NULL)
-                LIMIT 1
-            """, (org_id, action_type))
-            
-            rule = cur.fetchone()
+            refresh_rule_table(cur, org_points[1])
+            rule = evaluate_rule(int(org_id), action_type)
             
             if not rule:
                 return {
@@ -151,24 +499,28 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            base_points = float(rule[0])
-            rule_name = rule[1]
-            multiplier = float(rule[2])
-            points_to_add = base_points * multiplier
+            points_to_add, rule_name = rule
+            append_only = org_points[2]
             
-            cur.execute("""
-                UPDATE t_p80499285_psot_realization_pro.organization_points
-                SET points_balance = points_balance + %s,
-                    total_earned = total_earned + %s,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE organization_id = %s
-            """, (points_to_add, points_to_add, org_id))
+            if not append_only:
+                cur.execute("""
+                    UPDATE t_p80499285_psot_realization_pro.organization_points
+                    SET points_balance = points_balance + %s,
+                        total_earned = total_earned + %s,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE organization_id = %s
+                """, (points_to_add, points_to_add, org_id))
             
             cur.execute("""
                 INSERT INTO t_p80499285_psot_realization_pro.points_history
-                (organization_id, points_amount, operation_type, description)
-                VALUES (%s, %s, %s, %s)
-            """, (org_id, points_to_add, action_type, f'Автоначисление: {rule_name}'))
+                (organization_id, points_amount, operation_type, description, pending)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING created_at
+            """, (org_id, points_to_add, action_type, f'Автоначисление: {rule_name}', append_only))
+            created_at = cur.fetchone()[0]
+            
+            if not append_only:
+                apply_points_summary(cur, [(org_id, created_at, action_type, points_to_add)])
             
             if user_id:
                 cur.execute("""
@@ -226,6 +578,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     VALUES (%s, %s, %s, %s)
                 """, (org_id, rule_id, is_enabled, multiplier))
             
+            bump_rules_version(cur)
             conn.commit()
             
             return {
@@ -1,7 +1,88 @@
 import json
+import time
 import os
 import psycopg2
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+MODULE_GUARD_TTL = 5
+
+_module_guard_users: Dict[int, tuple] = {}
+_module_guard_modules: Dict[int, tuple] = {}
+
+MODULE_GUARD_SQL = '''
+    SELECT u.organization_id, COALESCE(e.version, 0),
+           CASE WHEN u.organization_id = %(organization_id)s AND COALESCE(e.version, 0) = %(version)s THEN NULL
+                ELSE ARRAY(
+                    SELECT module ->> 'module_type'
+                    FROM jsonb_array_elements(COALESCE(
+                        e.document, t_p80499285_psot_realization_pro.resolve_entitlements(u.organization_id)
+                    ) -> 'modules') module
+                )
+           END
+    FROM t_p80499285_psot_realization_pro.users u
+    LEFT JOIN t_p80499285_psot_realization_pro.organization_entitlements e ON e.organization_id = u.organization_id
+    WHERE u.id = %(user_id)s
+'''
+
+def caller_user_id(event: Dict[str, Any]) -> Optional[int]:
+    '''Идентификатор вызывающего: заголовок X-User-Id, затем user_id в query или JSON-теле'''
+    headers = event.get('headers') or {}
+    raw = headers.get('X-User-Id') or headers.get('x-user-id') or (event.get('queryStringParameters') or {}).get('user_id')
+    if not raw and event.get('body') and not event.get('isBase64Encoded'):
+        try:
+            body = json.loads(event['body'])
+            raw = body.get('user_id') if isinstance(body, dict) else None
+        except ValueError:
+            raw = None
+    try:
+        return int(raw) if raw else None
+    except (TypeError, ValueError):
+        return None
+
+def module_guard_denied(body: Dict[str, Any]) -> Dict[str, Any]:
+    '''Ответ 403 проверки модуля'''
+    return {
+        'statusCode': 403,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(body, ensure_ascii=False),
+        'isBase64Encoded': False
+    }
+
+def require_module(event: Dict[str, Any], module_type: str) -> Optional[Dict[str, Any]]:
+    '''Проверка модуля по документу прав предприятия (organization_entitlements); модули перечитываются только при смене версии. None - доступ разрешён'''
+    user_id = caller_user_id(event)
+    if not user_id:
+        return module_guard_denied({'error': 'Не указан пользователь'})
+    
+    now = time.monotonic()
+    cached = _module_guard_users.get(user_id)
+    if not cached or cached[0] <= now:
+        known = _module_guard_modules.get(cached[1]) if cached else None
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        cur = conn.cursor()
+        try:
+            cur.execute(MODULE_GUARD_SQL, {
+                'user_id': user_id,
+                'organization_id': cached[1] if known else None,
+                'version': known[0] if known else None
+            })
+            row = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        
+        if not row:
+            return module_guard_denied({'error': 'Пользователь не найден'})
+        organization_id, version, modules = row
+        if organization_id and modules is not None:
+            _module_guard_modules[organization_id] = (version, frozenset(modules))
+        cached = (now + MODULE_GUARD_TTL, organization_id)
+        _module_guard_users[user_id] = cached
+    
+    organization_id = cached[1]
+    if not organization_id or module_type in _module_guard_modules[organization_id][1]:
+        return None
+    return module_guard_denied({'error': 'Модуль не подключён для вашего предприятия', 'module': module_type})
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -17,13 +98,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    denied = require_module(event, 'storage')
+    if denied:
+        return denied
+    
     conn = psycopg2.connect(os.environ['DATABASE_URL'])
     cur = conn.cursor()
     
@@ -3,6 +3,17 @@ import os
 import psycopg2
 from typing import Dict, Any
 
+def bump_entitlements_for_tariff(cur, tariff_id) -> None:
+    '''Новая версия прав у всех предприятий на тарифе: документы пересчитает entitlements'''
+    cur.execute('''
+        UPDATE t_p80499285_psot_realization_pro.organization_entitlements e
+        SET version = e.version + 1,
+            document = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        FROM t_p80499285_psot_realization_pro.organizations o
+        WHERE o.id = e.organization_id AND o.tariff_plan_id = %s
+    ''', (tariff_id,))
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     API управления тарифными планами
@@ -202,13 +213,27 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             cur.execute(query, params)
         
         if 'module_ids' in body:
-            cur.execute('DELETE FROM t_p80499285_psot_realization_pro.tariff_modules WHERE tariff_id = %s', (tariff_id,))
+            module_ids = list({int(module_id) for module_id in body['module_ids']})
+            
+            # Удаляем и добавляем только разницу с текущим набором модулей тарифа
+            cur.execute('''
+                DELETE FROM t_p80499285_psot_realization_pro.tariff_modules
+                WHERE tariff_id = %s AND module_id <> ALL(%s::int[])
+            ''', (tariff_id, module_ids))
+            changed = cur.rowcount
+            
+            cur.execute('''
+                INSERT INTO t_p80499285_psot_realization_pro.tariff_modules (tariff_id, module_id)
+                SELECT %s, requested.module_id FROM unnest(%s::int[]) AS requested(module_id)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM t_p80499285_psot_realization_pro.tariff_modules tm
+                    WHERE tm.tariff_id = %s AND tm.module_id = requested.module_id
+                )
+            ''', (tariff_id, module_ids, tariff_id))
+            changed += cur.rowcount
             
-            for module_id in body['module_ids']:
-                cur.execute('''
-                    INSERT INTO t_p80499285_psot_realization_pro.tariff_modules (tariff_id, module_id)
-                    VALUES (%s, %s)
-                ''', (tariff_id, module_id))
+            if changed:
+                bump_entitlements_for_tariff(cur, tariff_id)
         
         conn.commit()
         cur.close()
@@ -0,0 +1,251 @@
+import json
+import os
+import psycopg2
+from psycopg2.extras import execute_values, Json
+from typing import Dict, Any, List, Tuple
+from datetime import datetime, date
+
+PARTITIONS_AHEAD = 3
+RETENTION_MONTHS = 24
+MAX_BATCH_SIZE = 5000
+
+def get_db_connection():
+    """Создает подключение к базе данных"""
+    dsn = os.environ.get('DATABASE_URL')
+    return psycopg2.connect(dsn)
+
+def validate_events(events: List[Dict[str, Any]]) -> Tuple[List[Tuple[int, tuple]], List[Dict[str, Any]]]:
+    """Проверка пачки событий, возвращает (индекс, строка для вставки) и список отклонённых"""
+    rows = []
+    rejected = []
+    today = date.today()
+    
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            rejected.append({'index': index, 'error': 'событие должно быть объектом'})
+            continue
+        
+        user_id = event.get('user_id')
+        activity_type = event.get('activity_type')
+        details = event.get('details') or {}
+        client_event_id = event.get('client_event_id')
+        
+        if not isinstance(user_id, int) or isinstance(user_id, bool) or user_id <= 0:
+            rejected.append({'index': index, 'error': 'user_id обязателен'})
+            continue
+        
+        if not isinstance(activity_type, str) or not activity_type or len(activity_type) > 50:
+            rejected.append({'index': index, 'error': 'activity_type обязателен (до 50 символов)'})
+            continue
+        
+        if not isinstance(details, dict):
+            rejected.append({'index': index, 'error': 'details должен быть объектом'})
+            continue
+        
+        if client_event_id is not None and (not isinstance(client_event_id, str) or len(client_event_id) > 64):
+            rejected.append({'index': index, 'error': 'client_event_id до 64 символов'})
+            continue
+        
+        try:
+            occurred_at = datetime.fromisoformat(event['occurred_at']) if event.get('occurred_at') else datetime.now()
+        except (TypeError, ValueError):
+            rejected.append({'index': index, 'error': 'occurred_at должен быть в формате ISO 8601'})
+            continue
+        
+        if occurred_at.date() > today:
+            rejected.append({'index': index, 'error': 'occurred_at в будущем'})
+            continue
+        
+        details = dict(details, offline=bool(event.get('offline', False)))
+        rows.append((index, (user_id, activity_type, occurred_at.date(), Json(details), occurred_at.replace(tzinfo=None), client_event_id)))
+    
+    return rows, rejected
+
+def apply_activity_counters(cur, inserted: List[tuple]) -> None:
+    """Обновление user_stats и user_activity_daily по фактически вставленным событиям"""
+    per_user = {}
+    per_day = {}
+    
+    for user_id, activity_date, offline in inserted:
+        online_count, offline_count, last_date = per_user.get(user_id, (0, 0, activity_date))
+        if offline:
+            offline_count += 1
+        else:
+            online_count += 1
+        per_user[user_id] = (online_count, offline_count, max(last_date, activity_date))
+        per_day[(user_id, activity_date)] = per_day.get((user_id, activity_date), 0) + 1
+    
+    # Сортировка задаёт единый порядок блокировок для параллельных пачек
+    execute_values(cur, """
+        INSERT INTO t_p80499285_psot_realization_pro.user_stats (user_id, online_count, offline_count, last_activity_date)
+        VALUES %s
+        ON CONFLICT (user_id) DO UPDATE SET
+            online_count = user_stats.online_count + EXCLUDED.online_count,
+            offline_count = user_stats.offline_count + EXCLUDED.offline_count,
+            last_activity_date = GREATEST(user_stats.last_activity_date, EXCLUDED.last_activity_date),
+            updated_at = CURRENT_TIMESTAMP
+    """, [(user_id,) + counters for user_id, counters in sorted(per_user.items())])
+    
+    execute_values(cur, """
+        INSERT INTO t_p80499285_psot_realization_pro.user_activity_daily (user_id, day, count)
+        VALUES %s
+        ON CONFLICT (user_id, day) DO UPDATE SET count = user_activity_daily.count + EXCLUDED.count
+    """, [key + (count,) for key, count in sorted(per_day.items())])
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    API журнала активности пользователей
+    POST {action: ingest, events: [...]} - пакетная запись событий (буфер клиента, в т.ч. офлайн)
+    POST {action: maintain} - создать будущие помесячные партиции user_activity и применить политику хранения (retention_months не меньше RETENTION_MONTHS)
+    """
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    body = json.loads(event.get('body') or '{}')
+    action = body.get('action')
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        if action == 'ingest':
+            events = body.get('events')
+            
+            if not isinstance(events, list) or not events:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'events должен быть непустым массивом'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if len(events) > MAX_BATCH_SIZE:
+                return {
+                    'statusCode': 413,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': f'Не больше {MAX_BATCH_SIZE} событий за запрос'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            validated, rejected = validate_events(events)
+            rows = []
+            
+            if validated:
+                cur.execute(
+                    "SELECT id FROM t_p80499285_psot_realization_pro.users WHERE id = ANY(%s)",
+                    (list({row[0] for _, row in validated}),)
+                )
+                known_users = {row[0] for row in cur.fetchall()}
+                
+                for index, row in validated:
+                    if row[0] in known_users:
+                        rows.append(row)
+                    else:
+                        rejected.append({'index': index, 'error': 'пользователь не найден'})
+            
+            inserted = []
+            if rows:
+                inserted = execute_values(cur, """
+                    INSERT INTO t_p80499285_psot_realization_pro.user_activity
+                    (user_id, activity_type, activity_date, details, created_at, client_event_id)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING user_id, activity_date, (details->>'offline')::boolean
+                """, rows, page_size=len(rows), fetch=True)
+                
+                if inserted:
+                    apply_activity_counters(cur, inserted)
+            
+            conn.commit()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'accepted': len(inserted),
+                    'duplicates': len(rows) - len(inserted),
+                    'rejected': rejected
+                }, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'maintain':
+            months_ahead = int(body.get('months_ahead', PARTITIONS_AHEAD))
+            retention_months = body.get('retention_months', RETENTION_MONTHS)
+            archive = bool(body.get('archive', False))
+            
+            if not isinstance(retention_months, int) or isinstance(retention_months, bool) or retention_months <= 0:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'retention_months должен быть положительным целым числом'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            # Запрос может только продлить хранение, но не сократить его ниже политики
+            retention_months = max(retention_months, RETENTION_MONTHS)
+            
+            cur.execute(
+                "SELECT t_p80499285_psot_realization_pro.ensure_user_activity_partitions(CURRENT_DATE, %s)",
+                (months_ahead,)
+            )
+            created = cur.fetchone()[0]
+            
+            cur.execute(
+                "SELECT t_p80499285_psot_realization_pro.drop_user_activity_partitions(%s, %s)",
+                (retention_months, archive)
+            )
+            removed = cur.fetchone()[0]
+            
+            conn.commit()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'partitions_created': created,
+                    'partitions_removed': removed,
+                    'retention_months': retention_months,
+                    'archived': archive
+                }, ensure_ascii=False),
+                'isBase64Encoded': False
+            }
+        
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Неизвестное действие'}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        conn.rollback()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    finally:
+        cur.close()
+        conn.close()
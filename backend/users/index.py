@@ -1,6 +1,227 @@
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List
+
+STATS_CHUNK_SIZE = 1000
+STATS_WORKERS = 4
+
+EXPORT_BATCH_SIZE = 2000
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+EXPORT_INLINE_MAX_BYTES = 4 * 1024 * 1024
+EXPORT_COLUMNS = [
+    'id', 'email', 'fio', 'display_name', 'company', 'subdivision', 'position', 'role', 'created_at',
+    'registered_count', 'online_count', 'offline_count',
+    'pab_total', 'observations_issued', 'prescriptions_issued', 'audits_conducted'
+]
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+RECALC_STATS_SQL = """
+    INSERT INTO t_p80499285_psot_realization_pro.user_stats
+        (user_id, pab_total, pab_in_progress, pab_overdue,
+         observations_issued, observations_in_progress, observations_overdue,
+         prescriptions_issued, prescriptions_completed, prescriptions_in_progress, prescriptions_overdue,
+         audits_conducted, updated_at)
+    SELECT u.id,
+           COALESCE(p.pab_total, 0), COALESCE(p.pab_in_progress, 0), COALESCE(p.pab_overdue, 0),
+           COALESCE(p.observations_issued, 0), COALESCE(p.observations_issued - p.observations_overdue, 0), COALESCE(p.observations_overdue, 0),
+           COALESCE(pr.issued, 0), COALESCE(pr.completed, 0), COALESCE(pr.issued - pr.completed - pr.overdue, 0), COALESCE(pr.overdue, 0),
+           COALESCE(a.conducted, 0), CURRENT_TIMESTAMP
+    FROM unnest(%(ids)s::int[]) AS u(id)
+    LEFT JOIN (
+        SELECT r.user_id,
+               COUNT(*) as pab_total,
+               COUNT(*) FILTER (WHERE r.overdue = 0) as pab_in_progress,
+               COUNT(*) FILTER (WHERE r.overdue > 0) as pab_overdue,
+               SUM(r.issued) as observations_issued,
+               SUM(r.overdue) as observations_overdue
+        FROM (
+            SELECT pr.user_id, pr.id,
+                   COUNT(po.id) as issued,
+                   COUNT(po.id) FILTER (WHERE po.deadline < CURRENT_DATE) as overdue
+            FROM t_p80499285_psot_realization_pro.pab_records pr
+            LEFT JOIN t_p80499285_psot_realization_pro.pab_observations po ON po.pab_record_id = pr.id
+            WHERE pr.user_id = ANY(%(ids)s)
+            GROUP BY pr.user_id, pr.id
+        ) r
+        GROUP BY r.user_id
+    ) p ON p.user_id = u.id
+    LEFT JOIN (
+        SELECT user_id,
+               COUNT(*) as issued,
+               COUNT(*) FILTER (WHERE status = 'completed' OR fact_date IS NOT NULL) as completed,
+               COUNT(*) FILTER (WHERE COALESCE(status, '') <> 'completed' AND fact_date IS NULL AND plan_date < CURRENT_DATE) as overdue
+        FROM t_p80499285_psot_realization_pro.prescriptions
+        WHERE user_id = ANY(%(ids)s)
+        GROUP BY user_id
+    ) pr ON pr.user_id = u.id
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) as conducted
+        FROM t_p80499285_psot_realization_pro.audits
+        WHERE user_id = ANY(%(ids)s) AND (status = 'completed' OR fact_date IS NOT NULL)
+        GROUP BY user_id
+    ) a ON a.user_id = u.id
+    ON CONFLICT (user_id) DO UPDATE SET
+        pab_total = EXCLUDED.pab_total,
+        pab_in_progress = EXCLUDED.pab_in_progress,
+        pab_overdue = EXCLUDED.pab_overdue,
+        observations_issued = EXCLUDED.observations_issued,
+        observations_in_progress = EXCLUDED.observations_in_progress,
+        observations_overdue = EXCLUDED.observations_overdue,
+        prescriptions_issued = EXCLUDED.prescriptions_issued,
+        prescriptions_completed = EXCLUDED.prescriptions_completed,
+        prescriptions_in_progress = EXCLUDED.prescriptions_in_progress,
+        prescriptions_overdue = EXCLUDED.prescriptions_overdue,
+        audits_conducted = EXCLUDED.audits_conducted,
+        updated_at = EXCLUDED.updated_at
+"""
+
+def build_user_filters(params: Dict[str, Any]):
+    '''WHERE-условие списка пользователей: поиск по ФИО/email/компании, роль, предприятие'''
+    conditions = []
+    values = []
+    
+    search = (params.get('search') or '').strip()
+    if search:
+        conditions.append("(u.fio ILIKE %s OR u.email ILIKE %s OR u.company ILIKE %s)")
+        pattern = f"%{search}%"
+        values.extend([pattern, pattern, pattern])
+    
+    if params.get('role'):
+        conditions.append("u.role = %s")
+        values.append(params['role'])
+    
+    if params.get('organization_id'):
+        conditions.append("u.organization_id = %s")
+        values.append(int(params['organization_id']))
+    
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return where_sql, values
+
+def export_users(conn, params: Dict[str, Any], export_format: str, is_superadmin: bool):
+    '''
+    Выгрузка пользователей серверным курсором пачками по EXPORT_BATCH_SIZE строк.
+    Строки сразу пишутся в SpooledTemporaryFile, поэтому в памяти держится одна пачка.
+    Returns: (файл, число строк)
+    '''
+    import csv
+    import io
+    import tempfile
+    
+    where_sql, values = build_user_filters(params)
+    
+    cur = conn.cursor(name='users_export')
+    cur.execute(f"""
+        SELECT u.id, u.email, u.fio, u.display_name, u.company, u.subdivision, u.position, u.role, u.created_at,
+               COALESCE(s.registered_count, 0), COALESCE(s.online_count, 0), COALESCE(s.offline_count, 0),
+               COALESCE(s.pab_total, 0), COALESCE(s.observations_issued, 0),
+               COALESCE(s.prescriptions_issued, 0), COALESCE(s.audits_conducted, 0)
+        FROM t_p80499285_psot_realization_pro.users u
+        LEFT JOIN t_p80499285_psot_realization_pro.user_stats s ON u.id = s.user_id
+        {where_sql}
+        ORDER BY u.id
+    """, values)
+    
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    total = 0
+    
+    if export_format == 'xlsx':
+        from openpyxl import Workbook
+        
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('users')
+        sheet.append(EXPORT_COLUMNS)
+    else:
+        text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+        writer = csv.writer(text) if export_format == 'csv' else None
+        if writer:
+            text.write('\ufeff')
+            writer.writerow(EXPORT_COLUMNS)
+    
+    while True:
+        batch = cur.fetchmany(EXPORT_BATCH_SIZE)
+        if not batch:
+            break
+        
+        for row in batch:
+            row = list(row)
+            if not is_superadmin:
+                row[2] = row[3]
+            row[8] = row[8].isoformat() if row[8] else None
+            
+            if export_format == 'xlsx':
+                sheet.append(row)
+            elif writer:
+                writer.writerow(row)
+            else:
+                text.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n')
+        
+        total += len(batch)
+    
+    cur.close()
+    
+    if export_format == 'xlsx':
+        workbook.save(out)
+    else:
+        text.detach()
+    
+    out.seek(0)
+    return out, total
+
+def upload_export(export_file, export_format: str):
+    '''Загрузка выгрузки в R2 потоковым multipart upload; None, если R2 не настроен (тогда отдаются только выгрузки до EXPORT_INLINE_MAX_BYTES)'''
+    r2_access_key = os.environ.get('R2_ACCESS_KEY_ID')
+    r2_secret_key = os.environ.get('R2_SECRET_ACCESS_KEY')
+    r2_bucket = os.environ.get('R2_BUCKET_NAME')
+    r2_account_id = os.environ.get('R2_ACCOUNT_ID')
+    
+    if not all([r2_access_key, r2_secret_key, r2_bucket, r2_account_id]):
+        return None
+    
+    import uuid
+    import boto3
+    from botocore.client import Config
+    
+    s3_client = boto3.client(
+        's3',
+        endpoint_url=f'https://{r2_account_id}.r2.cloudflarestorage.com',
+        aws_access_key_id=r2_access_key,
+        aws_secret_access_key=r2_secret_key,
+        config=Config(signature_version='s3v4'),
+        region_name='auto'
+    )
+    
+    object_key = f'exports/users-{uuid.uuid4()}.{export_format}'
+    s3_client.upload_fileobj(
+        export_file, r2_bucket, object_key,
+        ExtraArgs={'ContentType': EXPORT_CONTENT_TYPES[export_format]}
+    )
+    return f'https://{r2_bucket}.{r2_account_id}.r2.cloudflarestorage.com/{object_key}'
+
+def bump_role_count(cur, organization_id, role, delta: int) -> None:
+    '''Write-through обновление агрегата user_role_counts'''
+    cur.execute("""
+        INSERT INTO t_p80499285_psot_realization_pro.user_role_counts (organization_id, role, user_count)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (organization_id, role) DO UPDATE
+        SET user_count = user_role_counts.user_count + EXCLUDED.user_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, (organization_id or 0, role or 'user', delta))
+
+def recalc_stats_chunk(user_ids: List[int]) -> int:
+    '''Пересчёт счётчиков user_stats для пачки пользователей на отдельном соединении'''
+    import psycopg2
+    
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute(RECALC_STATS_SQL, {'ids': user_ids})
+    conn.commit()
+    cur.close()
+    conn.close()
+    return len(user_ids)
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -35,16 +256,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if action == 'list':
             headers = event.get('headers', {})
             user_role = headers.get('X-User-Role', '')
+            where_sql, values = build_user_filters(params)
             
-            cur.execute("""
+            cur.execute(f"""
                 SELECT u.id, u.email, u.fio, u.display_name, u.company, u.subdivision, u.position, u.role, u.created_at,
                        COALESCE(s.registered_count, 0) as registered_count,
                        COALESCE(s.online_count, 0) as online_count,
                        COALESCE(s.offline_count, 0) as offline_count
                 FROM t_p80499285_psot_realization_pro.users u
                 LEFT JOIN t_p80499285_psot_realization_pro.user_stats s ON u.id = s.user_id
+                {where_sql}
                 ORDER BY u.created_at DESC
-            """)
+            """, values)
             
             users = []
             for row in cur.fetchall():
@@ -79,22 +302,96 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'success': True, 'users': users})
             }
         
+        elif action == 'export':
+            import base64
+            
+            headers = event.get('headers', {})
+            export_format = params.get('format', 'csv')
+            
+            if export_format not in EXPORT_CONTENT_TYPES:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'success': False, 'error': 'format must be csv, xlsx or ndjson'})
+                }
+            
+            cur.close()
+            export_file, total = export_users(conn, params, export_format, headers.get('X-User-Role', '') == 'superadmin')
+            conn.close()
+            
+            file_url = upload_export(export_file, export_format)
+            
+            if file_url:
+                export_file.close()
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'success': True, 'url': file_url, 'rows': total})
+                }
+            
+            # Без R2 файл возвращается в теле ответа целиком, поэтому только небольшие выгрузки
+            export_size = export_file.seek(0, 2)
+            if export_size > EXPORT_INLINE_MAX_BYTES:
+                export_file.close()
+                return {
+                    'statusCode': 413,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'success': False,
+                        'error': f'export is {export_size} bytes, inline download is limited to {EXPORT_INLINE_MAX_BYTES}; configure R2 (R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_ACCOUNT_ID) to get a download link',
+                        'rows': total
+                    })
+                }
+            
+            export_file.seek(0)
+            content = export_file.read()
+            export_file.close()
+            is_binary = export_format == 'xlsx'
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': EXPORT_CONTENT_TYPES[export_format],
+                    'Content-Disposition': f'attachment; filename="users.{export_format}"',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': is_binary,
+                'body': base64.b64encode(content).decode('ascii') if is_binary else content.decode('utf-8')
+            }
+        
         elif action == 'stats':
+            organization_id = params.get('organization_id')
+            
             cur.execute("""
                 SELECT 
-                    COUNT(*) as total_users,
-                    COUNT(CASE WHEN role = 'user' THEN 1 END) as users_count,
-                    COUNT(CASE WHEN role = 'admin' THEN 1 END) as admins_count,
-                    COUNT(CASE WHEN role = 'superadmin' THEN 1 END) as superadmins_count
-                FROM t_p80499285_psot_realization_pro.users
-            """)
+                    COALESCE(SUM(user_count), 0) as total_users,
+                    COALESCE(SUM(user_count) FILTER (WHERE role = 'user'), 0) as users_count,
+                    COALESCE(SUM(user_count) FILTER (WHERE role = 'admin'), 0) as admins_count,
+                    COALESCE(SUM(user_count) FILTER (WHERE role = 'superadmin'), 0) as superadmins_count
+                FROM t_p80499285_psot_realization_pro.user_role_counts
+                WHERE %s::int IS NULL OR organization_id = %s::int
+            """, (organization_id, organization_id))
             
             row = cur.fetchone()
             stats = {
-                'total_users': row[0],
-                'users_count': row[1],
-                'admins_count': row[2],
-                'superadmins_count': row[3]
+                'total_users': int(row[0]),
+                'users_count': int(row[1]),
+                'admins_count': int(row[2]),
+                'superadmins_count': int(row[3])
             }
             
             cur.close()
@@ -235,8 +532,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if action == 'update_role':
             new_role = body_data.get('role')
-            new_role_escaped = new_role.replace("'", "''")
-            cur.execute(f"UPDATE t_p80499285_psot_realization_pro.users SET role = '{new_role_escaped}' WHERE id = {user_id}")
+            cur.execute("""
+                WITH old AS (
+                    SELECT id, role, organization_id FROM t_p80499285_psot_realization_pro.users
+                    WHERE id = %s FOR UPDATE
+                )
+                UPDATE t_p80499285_psot_realization_pro.users u SET role = %s
+                FROM old WHERE u.id = old.id
+                RETURNING old.role, old.organization_id
+            """, (user_id, new_role))
+            old_row = cur.fetchone()
+            
+            if old_row and old_row[0] != new_role:
+                bump_role_count(cur, old_row[1], old_row[0], -1)
+                bump_role_count(cur, old_row[1], new_role, 1)
             conn.commit()
             
         elif action == 'update_profile':
@@ -374,6 +683,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             user_id = cur.fetchone()[0]
             
             cur.execute(f"INSERT INTO t_p80499285_psot_realization_pro.user_stats (user_id, registered_count) VALUES ({user_id}, 1)")
+            bump_role_count(cur, company_id, 'user', 1)
             
             cur.execute(f"SELECT registration_code FROM t_p80499285_psot_realization_pro.organizations WHERE id = {company_id}")
             org_code_row = cur.fetchone()
@@ -396,6 +706,34 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'success': True, 'loginLink': login_link})
             }
         
+        elif action == 'recalc_stats':
+            from concurrent.futures import ThreadPoolExecutor
+            
+            user_ids = body_data.get('userIds')
+            
+            if not user_ids:
+                conn = psycopg2.connect(os.environ['DATABASE_URL'])
+                cur = conn.cursor()
+                cur.execute("SELECT id FROM t_p80499285_psot_realization_pro.users ORDER BY id")
+                user_ids = [row[0] for row in cur.fetchall()]
+                cur.close()
+                conn.close()
+            
+            chunks = [[int(uid) for uid in user_ids[i:i + STATS_CHUNK_SIZE]] for i in range(0, len(user_ids), STATS_CHUNK_SIZE)]
+            
+            with ThreadPoolExecutor(max_workers=STATS_WORKERS) as pool:
+                recalculated = sum(pool.map(recalc_stats_chunk, chunks))
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'success': True, 'recalculated': recalculated, 'chunks': len(chunks)})
+            }
+        
         elif action == 'send_bulk_links':
             users_data = body_data.get('users', [])
             
@@ -458,6 +796,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             user_id = cur.fetchone()[0]
             
             cur.execute(f"INSERT INTO t_p80499285_psot_realization_pro.user_stats (user_id) VALUES ({user_id})")
+            bump_role_count(cur, None, role, 1)
             
             conn.commit()
             cur.close()
@@ -486,7 +825,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         cur.execute(f"DELETE FROM t_p80499285_psot_realization_pro.prescriptions WHERE user_id = {user_id}")
         cur.execute(f"DELETE FROM t_p80499285_psot_realization_pro.audits WHERE user_id = {user_id}")
         cur.execute(f"DELETE FROM t_p80499285_psot_realization_pro.violations WHERE user_id = {user_id}")
-        cur.execute(f"DELETE FROM t_p80499285_psot_realization_pro.users WHERE id = {user_id}")
+        cur.execute(f"DELETE FROM t_p80499285_psot_realization_pro.users WHERE id = {user_id} RETURNING role, organization_id")
+        deleted = cur.fetchone()
+        
+        if deleted:
+            bump_role_count(cur, deleted[1], deleted[0], -1)
         
         conn.commit()
         cur.close()
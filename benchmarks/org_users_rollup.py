@@ -0,0 +1,119 @@
+"""
+Сравнение запроса org-users: коррелированные подзапросы против дневного агрегата.
+
+Запуск: DATABASE_URL=postgres://... python benchmarks/org_users_rollup.py [users] [runs]
+Данные создаются во временной схеме bench_org_users и удаляются после замера.
+"""
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+
+SCHEMA = 'bench_org_users'
+
+SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+SET search_path TO {SCHEMA};
+
+CREATE TABLE users (
+    id SERIAL PRIMARY KEY, email VARCHAR(255), fio VARCHAR(255), subdivision VARCHAR(255),
+    position VARCHAR(255), role VARCHAR(50), organization_id INTEGER, created_at TIMESTAMP
+);
+CREATE TABLE pab_records (id SERIAL PRIMARY KEY, user_id INTEGER);
+CREATE TABLE user_activity (
+    id SERIAL PRIMARY KEY, user_id INTEGER NOT NULL, activity_type VARCHAR(50) NOT NULL,
+    activity_date DATE NOT NULL
+);
+CREATE TABLE user_stats (user_id INTEGER PRIMARY KEY, pab_total INTEGER DEFAULT 0, last_activity_date DATE);
+CREATE TABLE user_activity_daily (user_id INTEGER NOT NULL, day DATE NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (user_id, day));
+
+INSERT INTO users (email, fio, subdivision, position, role, organization_id, created_at)
+SELECT 'u' || g || '@bench', 'Сотрудник ' || g, 'Цех', 'Инженер', 'user', 1, now() - g * interval '1 minute'
+FROM generate_series(1, %(users)s) g;
+
+INSERT INTO pab_records (user_id)
+SELECT 1 + (g %% %(users)s) FROM generate_series(1, %(users)s * 3) g;
+
+INSERT INTO user_activity (user_id, activity_type, activity_date)
+SELECT 1 + (g %% %(users)s), 'click', CURRENT_DATE - (g %% 90)
+FROM generate_series(1, %(users)s * 40) g;
+
+CREATE INDEX ON users(organization_id, created_at DESC, id DESC);
+CREATE INDEX ON pab_records(user_id);
+CREATE INDEX ON user_activity(user_id);
+CREATE INDEX ON user_activity(activity_date);
+
+INSERT INTO user_activity_daily SELECT user_id, activity_date, COUNT(*) FROM user_activity GROUP BY 1, 2;
+INSERT INTO user_stats (user_id, pab_total, last_activity_date)
+SELECT u.id,
+       (SELECT COUNT(*) FROM pab_records WHERE user_id = u.id),
+       (SELECT MAX(day) FROM user_activity_daily WHERE user_id = u.id)
+FROM users u;
+ANALYZE;
+"""
+
+CORRELATED_SQL = """
+SELECT u.id, u.email, u.fio, u.subdivision, u.position, u.role, u.created_at,
+       (SELECT COUNT(*) FROM pab_records WHERE user_id = u.id),
+       (SELECT COUNT(*) FROM user_activity WHERE user_id = u.id AND activity_date >= CURRENT_DATE - INTERVAL '30 days'),
+       (SELECT MAX(activity_date) FROM user_activity WHERE user_id = u.id)
+FROM users u
+WHERE u.organization_id = 1
+ORDER BY u.created_at DESC
+"""
+
+ROLLUP_SQL = """
+WITH page AS (
+    SELECT u.id, u.email, u.fio, u.subdivision, u.position, u.role, u.created_at
+    FROM users u
+    WHERE u.organization_id = 1
+    ORDER BY u.created_at DESC, u.id DESC
+    {limit}
+)
+SELECT p.*, COALESCE(s.pab_total, 0), COALESCE(a.activities, 0), s.last_activity_date
+FROM page p
+LEFT JOIN user_stats s ON s.user_id = p.id
+LEFT JOIN (
+    SELECT d.user_id, SUM(d.count) as activities
+    FROM user_activity_daily d
+    WHERE d.user_id IN (SELECT id FROM page) AND d.day >= CURRENT_DATE - 30
+    GROUP BY d.user_id
+) a ON a.user_id = p.id
+ORDER BY p.created_at DESC, p.id DESC
+"""
+
+def measure(cur, sql: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cur.execute(sql)
+        cur.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def main() -> None:
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    
+    try:
+        cur.execute(SETUP_SQL, {'users': users})
+        cur.execute(f'SET search_path TO {SCHEMA}')
+        
+        print(f'users per org: {users}, runs: {runs}')
+        print(f"correlated subqueries, full org: {measure(cur, CORRELATED_SQL, runs):9.1f} ms")
+        print(f"rollup join, full org:           {measure(cur, ROLLUP_SQL.format(limit=''), runs):9.1f} ms")
+        print(f"rollup join, page of 100:        {measure(cur, ROLLUP_SQL.format(limit='LIMIT 100'), runs):9.1f} ms")
+    finally:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
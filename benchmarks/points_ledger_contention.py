@@ -0,0 +1,137 @@
+"""
+Конкурентные начисления на одно предприятие: обновление строки баланса против журнала append_only.
+
+Запуск: DATABASE_URL=postgres://... python benchmarks/points_ledger_contention.py [workers] [accruals_per_worker]
+Данные создаются во временной схеме bench_points_ledger и удаляются после замера.
+"""
+import os
+import statistics
+import sys
+import threading
+import time
+
+import psycopg2
+
+SCHEMA = 'bench_points_ledger'
+
+SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+SET search_path TO {SCHEMA};
+
+CREATE TABLE organization_points (
+    organization_id INTEGER PRIMARY KEY, points_balance NUMERIC(14,2) DEFAULT 0,
+    total_earned NUMERIC(14,2) DEFAULT 0, total_spent NUMERIC(14,2) DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE points_history (
+    id SERIAL PRIMARY KEY, organization_id INTEGER, points_amount NUMERIC(10,2), operation_type VARCHAR(50),
+    description TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, pending BOOLEAN NOT NULL DEFAULT false
+);
+CREATE INDEX ON points_history(organization_id) INCLUDE (points_amount) WHERE pending;
+INSERT INTO organization_points (organization_id) VALUES (1);
+"""
+
+IN_PLACE_SQL = """
+UPDATE organization_points SET points_balance = points_balance + 50, total_earned = total_earned + 50,
+    updated_at = CURRENT_TIMESTAMP
+WHERE organization_id = 1;
+INSERT INTO points_history (organization_id, points_amount, operation_type, description)
+VALUES (1, 50, 'pab_create', 'Автоначисление: Создание записи ПАБ');
+"""
+
+APPEND_ONLY_SQL = """
+INSERT INTO points_history (organization_id, points_amount, operation_type, description, pending)
+VALUES (1, 50, 'pab_create', 'Автоначисление: Создание записи ПАБ', true);
+"""
+
+COMPACT_SQL = """
+WITH batch AS (
+    SELECT id FROM points_history WHERE pending ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+), rolled AS (
+    UPDATE points_history h SET pending = false FROM batch WHERE h.id = batch.id
+    RETURNING h.organization_id, h.points_amount
+), balances AS (
+    UPDATE organization_points op
+    SET points_balance = op.points_balance + t.amount, total_earned = op.total_earned + t.amount
+    FROM (SELECT organization_id, SUM(points_amount) as amount FROM rolled GROUP BY organization_id) t
+    WHERE op.organization_id = t.organization_id
+)
+SELECT COUNT(*) FROM rolled
+"""
+
+BALANCE_SQL = """
+SELECT op.points_balance + COALESCE((
+    SELECT SUM(points_amount) FROM points_history WHERE organization_id = 1 AND pending
+), 0)
+FROM organization_points op WHERE op.organization_id = 1
+"""
+
+def run_workers(sql: str, workers: int, accruals: int) -> tuple:
+    latencies = []
+    lock = threading.Lock()
+    
+    def worker() -> None:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        cur = conn.cursor()
+        cur.execute(f'SET search_path TO {SCHEMA}')
+        conn.commit()
+        timings = []
+        for _ in range(accruals):
+            started = time.perf_counter()
+            cur.execute(sql)
+            conn.commit()
+            timings.append((time.perf_counter() - started) * 1000)
+        cur.close()
+        conn.close()
+        with lock:
+            latencies.extend(timings)
+    
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+def main() -> None:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    accruals = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    
+    try:
+        cur.execute(SETUP_SQL)
+        cur.execute(f'SET search_path TO {SCHEMA}')
+        
+        print(f'workers: {workers}, accruals per worker: {accruals}, one organization')
+        for name, sql in (('update in place', IN_PLACE_SQL), ('append only    ', APPEND_ONLY_SQL)):
+            throughput, median, p95 = run_workers(sql, workers, accruals)
+            print(f'{name}: {throughput:9.0f} accruals/s, median {median:6.2f} ms, p95 {p95:6.2f} ms')
+        
+        started = time.perf_counter()
+        compacted = 0
+        while True:
+            cur.execute(COMPACT_SQL, (5000,))
+            rolled = cur.fetchone()[0]
+            compacted += rolled
+            if rolled < 5000:
+                break
+        print(f'compactor: {compacted} entries in {(time.perf_counter() - started) * 1000:.1f} ms')
+        
+        cur.execute(BALANCE_SQL)
+        expected = 2 * workers * accruals * 50
+        print(f'balance after compaction: {cur.fetchone()[0]} (expected {expected})')
+    finally:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
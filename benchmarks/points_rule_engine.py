@@ -0,0 +1,55 @@
+"""
+Микробенчмарк скомпилированной таблицы правил points-rules: оценок начисления в секунду.
+
+Запуск: python benchmarks/points_rule_engine.py [organizations] [evaluations]
+БД не нужна: правила и переопределения предприятий генерируются в памяти.
+"""
+import importlib.util
+import os
+import random
+import sys
+import time
+
+ACTION_TYPES = [
+    'user_registration', 'user_login', 'pab_create', 'file_upload', 'folder_create',
+    'profile_complete', 'activity_milestone_10', 'activity_milestone_50', 'activity_milestone_100', 'safety_month'
+]
+
+def load_points_rules():
+    path = os.path.join(os.path.dirname(__file__), '..', 'backend', 'points-rules', 'index.py')
+    spec = importlib.util.spec_from_file_location('points_rules', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def main() -> None:
+    organizations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    evaluations = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    points_rules = load_points_rules()
+    rng = random.Random(42)
+    
+    rules = [(index + 1, action_type, 5 * (index + 1), f'Правило {index + 1}') for index, action_type in enumerate(ACTION_TYPES)]
+    overrides = [
+        (org_id, rule_id, rng.random() > 0.2, rng.choice([None, 0.5, 1.0, 2.0]))
+        for org_id in range(1, organizations + 1)
+        for rule_id in rng.sample(range(1, len(rules) + 1), 3)
+    ]
+    
+    started = time.perf_counter()
+    defaults, orgs = points_rules.compile_rule_table(rules, overrides)
+    compile_ms = (time.perf_counter() - started) * 1000
+    points_rules._rule_table.update(version=1, defaults=defaults, orgs=orgs)
+    
+    requests = [(rng.randint(1, organizations * 2), rng.choice(ACTION_TYPES)) for _ in range(evaluations)]
+    evaluate_rule = points_rules.evaluate_rule
+    started = time.perf_counter()
+    for org_id, action_type in requests:
+        evaluate_rule(org_id, action_type)
+    elapsed = time.perf_counter() - started
+    
+    print(f'organizations: {organizations}, overrides: {len(overrides)}, table entries: {len(orgs)}')
+    print(f'compile:    {compile_ms:9.1f} ms')
+    print(f'evaluate:   {evaluations / elapsed:12,.0f} evaluations/s ({elapsed * 1e9 / evaluations:.0f} ns each)')
+
+if __name__ == '__main__':
+    main()
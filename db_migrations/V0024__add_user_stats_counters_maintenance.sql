@@ -0,0 +1,16 @@
+-- Один ряд статистики на пользователя: счётчики кабинета обновляются через UPSERT
+DELETE FROM t_p80499285_psot_realization_pro.user_stats s
+USING t_p80499285_psot_realization_pro.user_stats d
+WHERE s.user_id = d.user_id AND s.id > d.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_user_stats_user_id
+ON t_p80499285_psot_realization_pro.user_stats(user_id);
+
+-- Индексы для пересчёта счётчиков из исходных таблиц
+CREATE INDEX IF NOT EXISTS idx_prescriptions_user_id
+ON t_p80499285_psot_realization_pro.prescriptions(user_id);
+
+CREATE INDEX IF NOT EXISTS idx_audits_user_id
+ON t_p80499285_psot_realization_pro.audits(user_id);
+
+COMMENT ON COLUMN t_p80499285_psot_realization_pro.user_stats.pab_total IS 'Инкрементируется pab-submit, пересчитывается users POST action=recalc_stats';
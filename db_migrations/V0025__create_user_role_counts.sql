@@ -0,0 +1,17 @@
+-- Счётчики пользователей по ролям и предприятиям, обновляются при создании, удалении и смене роли
+CREATE TABLE IF NOT EXISTS t_p80499285_psot_realization_pro.user_role_counts (
+    organization_id INTEGER NOT NULL DEFAULT 0,
+    role VARCHAR(50) NOT NULL,
+    user_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (organization_id, role)
+);
+
+-- Начальное заполнение из текущих данных
+INSERT INTO t_p80499285_psot_realization_pro.user_role_counts (organization_id, role, user_count)
+SELECT COALESCE(organization_id, 0), COALESCE(role, 'user'), COUNT(*)
+FROM t_p80499285_psot_realization_pro.users
+GROUP BY COALESCE(organization_id, 0), COALESCE(role, 'user')
+ON CONFLICT (organization_id, role) DO UPDATE SET user_count = EXCLUDED.user_count;
+
+COMMENT ON TABLE t_p80499285_psot_realization_pro.user_role_counts IS 'Агрегат пользователей по (предприятие, роль); organization_id = 0 для пользователей без предприятия';
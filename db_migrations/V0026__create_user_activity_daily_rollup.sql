@@ -0,0 +1,41 @@
+-- Дневной агрегат активности пользователей вместо подсчёта по user_activity на каждый запрос
+CREATE TABLE IF NOT EXISTS t_p80499285_psot_realization_pro.user_activity_daily (
+    user_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+INSERT INTO t_p80499285_psot_realization_pro.user_activity_daily (user_id, day, count)
+SELECT user_id, activity_date, COUNT(*)
+FROM t_p80499285_psot_realization_pro.user_activity
+GROUP BY user_id, activity_date
+ON CONFLICT (user_id, day) DO UPDATE SET count = EXCLUDED.count;
+
+-- Дата последней активности рядом с остальными счётчиками пользователя
+ALTER TABLE t_p80499285_psot_realization_pro.user_stats
+ADD COLUMN IF NOT EXISTS last_activity_date DATE;
+
+UPDATE t_p80499285_psot_realization_pro.user_stats s
+SET last_activity_date = d.last_day
+FROM (
+    SELECT user_id, MAX(day) as last_day
+    FROM t_p80499285_psot_realization_pro.user_activity_daily
+    GROUP BY user_id
+) d
+WHERE s.user_id = d.user_id;
+
+-- org-users читает user_stats.pab_total вместо подсчёта по pab_records: заполняем счётчик,
+-- создавая строки user_stats для пользователей, у которых их ещё нет
+INSERT INTO t_p80499285_psot_realization_pro.user_stats (user_id, pab_total)
+SELECT user_id, COUNT(*)
+FROM t_p80499285_psot_realization_pro.pab_records
+WHERE user_id IS NOT NULL
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET pab_total = EXCLUDED.pab_total;
+
+-- Keyset-пагинация списка пользователей предприятия
+CREATE INDEX IF NOT EXISTS idx_users_org_created_id
+ON t_p80499285_psot_realization_pro.users(organization_id, created_at DESC, id DESC);
+
+COMMENT ON TABLE t_p80499285_psot_realization_pro.user_activity_daily IS 'Число действий пользователя за день, обновляется писателями user_activity';
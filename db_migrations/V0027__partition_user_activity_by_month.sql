@@ -0,0 +1,97 @@
+-- Перевод user_activity на помесячные партиции по activity_date
+
+-- Создание партиций с месяца from_month до текущего месяца + months_ahead
+CREATE OR REPLACE FUNCTION t_p80499285_psot_realization_pro.ensure_user_activity_partitions(from_month DATE, months_ahead INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'user_activity_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass('t_p80499285_psot_realization_pro.' || partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE t_p80499285_psot_realization_pro.%I PARTITION OF t_p80499285_psot_realization_pro.user_activity FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + interval '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Удаление (или архивирование через DETACH + переименование) партиций старше keep_months месяцев
+CREATE OR REPLACE FUNCTION t_p80499285_psot_realization_pro.drop_user_activity_partitions(keep_months INTEGER, archive BOOLEAN DEFAULT false)
+RETURNS INTEGER AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => keep_months))::date;
+    part RECORD;
+    removed INTEGER := 0;
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = 't_p80499285_psot_realization_pro'
+          AND p.relname = 'user_activity'
+          AND c.relname ~ '^user_activity_[0-9]{4}_[0-9]{2}$'
+          AND to_date(right(c.relname, 7), 'YYYY_MM') < cutoff
+    LOOP
+        EXECUTE format('ALTER TABLE t_p80499285_psot_realization_pro.user_activity DETACH PARTITION t_p80499285_psot_realization_pro.%I', part.relname);
+        IF archive THEN
+            EXECUTE format('ALTER TABLE t_p80499285_psot_realization_pro.%I RENAME TO %I', part.relname, 'archive_' || part.relname);
+        ELSE
+            EXECUTE format('DROP TABLE t_p80499285_psot_realization_pro.%I', part.relname);
+        END IF;
+        removed := removed + 1;
+    END LOOP;
+    RETURN removed;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE t_p80499285_psot_realization_pro.user_activity RENAME TO user_activity_legacy;
+
+CREATE TABLE t_p80499285_psot_realization_pro.user_activity (
+    id BIGINT NOT NULL DEFAULT nextval('t_p80499285_psot_realization_pro.user_activity_id_seq'),
+    user_id INTEGER NOT NULL REFERENCES t_p80499285_psot_realization_pro.users(id),
+    activity_type VARCHAR(50) NOT NULL,
+    activity_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    details JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, activity_date)
+) PARTITION BY RANGE (activity_date);
+
+-- Страховочная партиция для дат вне созданных месяцев
+CREATE TABLE t_p80499285_psot_realization_pro.user_activity_default
+PARTITION OF t_p80499285_psot_realization_pro.user_activity DEFAULT;
+
+SELECT t_p80499285_psot_realization_pro.ensure_user_activity_partitions(
+    COALESCE((SELECT MIN(activity_date) FROM t_p80499285_psot_realization_pro.user_activity_legacy), CURRENT_DATE),
+    3
+);
+
+INSERT INTO t_p80499285_psot_realization_pro.user_activity (id, user_id, activity_type, activity_date, details, created_at)
+SELECT id, user_id, activity_type, activity_date, details, created_at
+FROM t_p80499285_psot_realization_pro.user_activity_legacy;
+
+ALTER SEQUENCE t_p80499285_psot_realization_pro.user_activity_id_seq AS BIGINT OWNED BY t_p80499285_psot_realization_pro.user_activity.id;
+
+DROP TABLE t_p80499285_psot_realization_pro.user_activity_legacy;
+
+-- B-tree только для выборок по пользователю, для сканов по времени — BRIN
+CREATE INDEX IF NOT EXISTS idx_user_activity_user_date
+ON t_p80499285_psot_realization_pro.user_activity(user_id, activity_date);
+
+CREATE INDEX IF NOT EXISTS brin_user_activity_date
+ON t_p80499285_psot_realization_pro.user_activity USING BRIN (activity_date);
+
+CREATE INDEX IF NOT EXISTS brin_user_activity_created
+ON t_p80499285_psot_realization_pro.user_activity USING BRIN (created_at);
+
+COMMENT ON TABLE t_p80499285_psot_realization_pro.user_activity IS 'Журнал активности, помесячные партиции; обслуживание через user-activity POST action=maintain';
@@ -0,0 +1,6 @@
+-- Идентификатор события на клиенте: повторная отправка буфера не создаёт дублей
+ALTER TABLE t_p80499285_psot_realization_pro.user_activity
+ADD COLUMN IF NOT EXISTS client_event_id VARCHAR(64);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_user_activity_client_event
+ON t_p80499285_psot_realization_pro.user_activity(client_event_id, activity_date);
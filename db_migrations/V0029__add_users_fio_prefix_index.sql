@@ -0,0 +1,3 @@
+-- Префиксный поиск по ФИО внутри предприятия (typeahead в org-users-select)
+CREATE INDEX IF NOT EXISTS idx_users_org_fio_prefix
+ON t_p80499285_psot_realization_pro.users(organization_id, lower(fio) text_pattern_ops);
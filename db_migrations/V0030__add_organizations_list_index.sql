@@ -0,0 +1,3 @@
+-- Порядок списка предприятий и курсорная пагинация (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_organizations_created_id
+ON t_p80499285_psot_realization_pro.organizations(created_at DESC, id DESC);
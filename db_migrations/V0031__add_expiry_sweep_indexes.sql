@@ -0,0 +1,17 @@
+-- Частичные индексы для планового снятия истёкших блокировок и пробных периодов (block-management action=sweep)
+CREATE INDEX IF NOT EXISTS idx_users_blocked_until
+ON t_p80499285_psot_realization_pro.users(blocked_until)
+WHERE is_blocked = true;
+
+CREATE INDEX IF NOT EXISTS idx_organizations_blocked_until
+ON t_p80499285_psot_realization_pro.organizations(blocked_until)
+WHERE is_blocked = true;
+
+CREATE INDEX IF NOT EXISTS idx_organizations_trial_end_date
+ON t_p80499285_psot_realization_pro.organizations(trial_end_date)
+WHERE is_active = true;
+
+-- Отметка обработанного пробного периода: предприятие, включённое администратором после истечения,
+-- не отключается повторно, пока пробный период не продлён на дату позже отметки
+ALTER TABLE t_p80499285_psot_realization_pro.organizations
+ADD COLUMN IF NOT EXISTS trial_expired_at TIMESTAMP;
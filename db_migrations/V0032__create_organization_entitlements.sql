@@ -0,0 +1,16 @@
+-- Версионированный кэш эффективных прав предприятия (модули, страницы, лимиты, функции)
+CREATE TABLE IF NOT EXISTS t_p80499285_psot_realization_pro.organization_entitlements (
+    organization_id INTEGER PRIMARY KEY REFERENCES t_p80499285_psot_realization_pro.organizations(id),
+    version BIGINT NOT NULL DEFAULT 1,
+    document JSONB,
+    computed_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_organizations_tariff_plan_id
+ON t_p80499285_psot_realization_pro.organizations(tariff_plan_id);
+
+CREATE INDEX IF NOT EXISTS idx_organizations_subscription_plan_id
+ON t_p80499285_psot_realization_pro.organizations(subscription_plan_id);
+
+COMMENT ON TABLE t_p80499285_psot_realization_pro.organization_entitlements IS 'version увеличивается при любой записи, влияющей на права; document = NULL до следующего пересчёта в entitlements';
@@ -0,0 +1,3 @@
+-- Счётчик действий пользователя, который обновляет points-rules при начислении баллов
+ALTER TABLE t_p80499285_psot_realization_pro.user_stats
+ADD COLUMN IF NOT EXISTS total_actions INTEGER DEFAULT 0;
@@ -0,0 +1,31 @@
+-- Индекс для курсорной пагинации журнала баллов предприятия
+CREATE INDEX IF NOT EXISTS idx_points_history_org_created_id
+ON t_p80499285_psot_realization_pro.points_history(organization_id, created_at DESC, id DESC);
+
+-- Помесячные итоги начислений и списаний по предприятию и типу операции, обновляются при записи в историю
+CREATE TABLE IF NOT EXISTS t_p80499285_psot_realization_pro.points_monthly_summary (
+    organization_id INTEGER NOT NULL,
+    month DATE NOT NULL,
+    operation_type VARCHAR(50) NOT NULL,
+    earned NUMERIC(14,2) NOT NULL DEFAULT 0,
+    spent NUMERIC(14,2) NOT NULL DEFAULT 0,
+    operations_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (organization_id, month, operation_type)
+);
+
+-- Начальное заполнение из истории
+INSERT INTO t_p80499285_psot_realization_pro.points_monthly_summary
+(organization_id, month, operation_type, earned, spent, operations_count)
+SELECT organization_id,
+       date_trunc('month', created_at)::date,
+       operation_type,
+       COALESCE(SUM(points_amount) FILTER (WHERE points_amount > 0), 0),
+       COALESCE(-SUM(points_amount) FILTER (WHERE points_amount < 0), 0),
+       COUNT(*)
+FROM t_p80499285_psot_realization_pro.points_history
+WHERE organization_id IS NOT NULL
+GROUP BY organization_id, date_trunc('month', created_at)::date, operation_type
+ON CONFLICT (organization_id, month, operation_type) DO NOTHING;
+
+COMMENT ON TABLE t_p80499285_psot_realization_pro.points_monthly_summary IS 'Итоги по месяцам для выписок; пополняется organization-points и points-rules вместе с points_history';
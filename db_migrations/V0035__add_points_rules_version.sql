@@ -0,0 +1,13 @@
+-- Версия набора правил начисления: points-rules держит скомпилированную таблицу правил в памяти
+-- и перезагружает её, только когда версия изменилась
+CREATE TABLE IF NOT EXISTS t_p80499285_psot_realization_pro.points_rules_state (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p80499285_psot_realization_pro.points_rules_state (id, version)
+VALUES (true, 1)
+ON CONFLICT (id) DO NOTHING;
+
+COMMENT ON TABLE t_p80499285_psot_realization_pro.points_rules_state IS 'Версия правил баллов; повышается points-rules PUT';
@@ -0,0 +1,3 @@
+-- Покрывающий индекс для сверки балансов: суммы по диапазону предприятий читаются index-only scan
+CREATE INDEX IF NOT EXISTS idx_points_history_org_amount
+ON t_p80499285_psot_realization_pro.points_history(organization_id) INCLUDE (points_amount);
@@ -0,0 +1,22 @@
+-- Режим журнала без обновления строки баланса: начисления только добавляются в points_history
+-- с pending = true, баланс = контрольная точка в organization_points + сумма ожидающих записей
+ALTER TABLE t_p80499285_psot_realization_pro.organization_points
+ADD COLUMN IF NOT EXISTS append_only BOOLEAN NOT NULL DEFAULT false;
+
+ALTER TABLE t_p80499285_psot_realization_pro.points_history
+ADD COLUMN IF NOT EXISTS pending BOOLEAN NOT NULL DEFAULT false;
+
+-- Ожидающие записи: расчёт текущего баланса и выборка компактором
+CREATE INDEX IF NOT EXISTS idx_points_history_pending
+ON t_p80499285_psot_realization_pro.points_history(organization_id) INCLUDE (points_amount)
+WHERE pending;
+
+-- Сверка балансов суммирует только записи, уже вошедшие в контрольную точку: частичный индекс
+-- заменяет полный индекс сверки, который после этого не нужен
+CREATE INDEX IF NOT EXISTS idx_points_history_settled
+ON t_p80499285_psot_realization_pro.points_history(organization_id) INCLUDE (points_amount)
+WHERE NOT pending;
+
+DROP INDEX IF EXISTS t_p80499285_psot_realization_pro.idx_points_history_org_amount;
+
+COMMENT ON COLUMN t_p80499285_psot_realization_pro.points_history.pending IS 'Запись ещё не перенесена в баланс; переносит organization-points POST action=compact';
@@ -0,0 +1,47 @@
+-- Рейтинг предприятий по начисленным баллам за всё время, текущий год и месяц (из помесячных итогов)
+CREATE MATERIALIZED VIEW IF NOT EXISTS t_p80499285_psot_realization_pro.leaderboard_organizations AS
+WITH periods(period, since) AS (
+    VALUES ('all', NULL::date),
+           ('year', date_trunc('year', CURRENT_DATE)::date),
+           ('month', date_trunc('month', CURRENT_DATE)::date)
+)
+SELECT p.period, s.organization_id, o.name, SUM(s.earned) as score, CURRENT_TIMESTAMP as refreshed_at
+FROM periods p
+JOIN t_p80499285_psot_realization_pro.points_monthly_summary s ON p.since IS NULL OR s.month >= p.since
+JOIN t_p80499285_psot_realization_pro.organizations o ON o.id = s.organization_id
+GROUP BY p.period, s.organization_id, o.name
+HAVING SUM(s.earned) > 0;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_leaderboard_organizations
+ON t_p80499285_psot_realization_pro.leaderboard_organizations(period, organization_id);
+
+CREATE INDEX IF NOT EXISTS idx_leaderboard_organizations_score
+ON t_p80499285_psot_realization_pro.leaderboard_organizations(period, score DESC, organization_id DESC);
+
+-- Рейтинг пользователей: за всё время по user_stats.total_actions, за год и месяц по дневному агрегату активности
+CREATE MATERIALIZED VIEW IF NOT EXISTS t_p80499285_psot_realization_pro.leaderboard_users AS
+SELECT 'all'::text as period, u.id as user_id, u.organization_id, u.fio, s.total_actions::bigint as score, CURRENT_TIMESTAMP as refreshed_at
+FROM t_p80499285_psot_realization_pro.user_stats s
+JOIN t_p80499285_psot_realization_pro.users u ON u.id = s.user_id
+WHERE s.total_actions > 0
+UNION ALL
+SELECT p.period, u.id, u.organization_id, u.fio, SUM(d.count)::bigint, CURRENT_TIMESTAMP
+FROM (
+    VALUES ('year', date_trunc('year', CURRENT_DATE)::date),
+           ('month', date_trunc('month', CURRENT_DATE)::date)
+) p(period, since)
+JOIN t_p80499285_psot_realization_pro.user_activity_daily d ON d.day >= p.since
+JOIN t_p80499285_psot_realization_pro.users u ON u.id = d.user_id
+GROUP BY p.period, u.id, u.organization_id, u.fio;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_leaderboard_users
+ON t_p80499285_psot_realization_pro.leaderboard_users(period, user_id);
+
+CREATE INDEX IF NOT EXISTS idx_leaderboard_users_score
+ON t_p80499285_psot_realization_pro.leaderboard_users(period, score DESC, user_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_leaderboard_users_org_score
+ON t_p80499285_psot_realization_pro.leaderboard_users(organization_id, period, score DESC, user_id DESC);
+
+COMMENT ON MATERIALIZED VIEW t_p80499285_psot_realization_pro.leaderboard_organizations IS 'Обновляется leaderboards POST action=refresh по расписанию';
+COMMENT ON MATERIALIZED VIEW t_p80499285_psot_realization_pro.leaderboard_users IS 'Обновляется leaderboards POST action=refresh по расписанию';
@@ -0,0 +1,52 @@
+-- Разрешение прав предприятия в одном месте: entitlements собирает из результата документ,
+-- проверки модулей в функциях читают сохранённый документ и вызывают функцию, только пока он не пересчитан.
+-- Для несуществующего предприятия возвращает NULL
+CREATE OR REPLACE FUNCTION t_p80499285_psot_realization_pro.resolve_entitlements(p_organization_id INTEGER)
+RETURNS JSONB AS $$
+    WITH org AS (
+        SELECT o.id, o.tariff_plan_id,
+               COALESCE(o.subscription_plan_id, (
+                   SELECT sp.id FROM t_p80499285_psot_realization_pro.subscription_plans sp
+                   WHERE sp.name = o.subscription_type
+                   ORDER BY sp.id
+                   LIMIT 1
+               )) as plan_id
+        FROM t_p80499285_psot_realization_pro.organizations o
+        WHERE o.id = p_organization_id
+    )
+    SELECT json_build_object(
+        'modules', COALESCE((
+            SELECT json_agg(json_build_object('id', m.id, 'name', m.name, 'module_type', m.module_type) ORDER BY m.id)
+            FROM t_p80499285_psot_realization_pro.modules m
+            LEFT JOIN t_p80499285_psot_realization_pro.organization_modules om
+                ON om.module_id = m.id AND om.organization_id = p_organization_id
+            WHERE m.is_active = true AND (
+                COALESCE(om.is_enabled, om.id IS NOT NULL)
+                OR (om.id IS NULL AND EXISTS (
+                    SELECT 1 FROM t_p80499285_psot_realization_pro.tariff_modules tm
+                    JOIN org ON org.tariff_plan_id = tm.tariff_id
+                    WHERE tm.module_id = m.id
+                ))
+            )
+        ), '[]'::json),
+        'pages', COALESCE((
+            SELECT json_agg(json_build_object('id', p.id, 'name', p.name, 'route', p.route) ORDER BY p.id)
+            FROM t_p80499285_psot_realization_pro.pages p
+            JOIN t_p80499285_psot_realization_pro.organization_pages op
+                ON op.page_id = p.id AND op.organization_id = p_organization_id
+            WHERE p.is_active = true
+        ), '[]'::json),
+        'plan', (
+            SELECT json_build_object('id', sp.id, 'name', sp.name, 'max_users', sp.max_users, 'features', sp.features)
+            FROM t_p80499285_psot_realization_pro.subscription_plans sp
+            JOIN org ON org.plan_id = sp.id
+        ),
+        'components', COALESCE((
+            SELECT json_agg(json_build_object('type', pc.component_type, 'name', pc.component_name) ORDER BY pc.id)
+            FROM t_p80499285_psot_realization_pro.plan_components pc
+            JOIN org ON org.plan_id = pc.plan_id
+            WHERE pc.is_included = true
+        ), '[]'::json)
+    )::jsonb
+    FROM org
+$$ LANGUAGE sql STABLE;
@@ -155,6 +155,7 @@ const FolderViewPage = () => {
       });
 
       xhr.open('POST', 'https://functions.poehali.dev/cbbbbc82-61fa-4061-88d0-900cb586aea6');
+      xhr.setRequestHeader('X-User-Id', localStorage.getItem('userId') || '');
       xhr.timeout = 300000; // 5 минут для больших файлов
       xhr.send(formData);
 
@@ -73,23 +73,15 @@ const OrganizationSettingsPage = () => {
 
   const loadData = async () => {
     try {
-      const [orgRes, modulesRes, pagesRes, pointsRes] = await Promise.all([
-        fetch(`https://functions.poehali.dev/5fa1bf89-3c17-4533-889a-7273e1ef1e3b?id=${id}`),
-        fetch(`https://functions.poehali.dev/a4f6bfe1-8f77-48b2-b6dd-70ac0a1c023a?type=modules&organization_id=${id}`),
-        fetch(`https://functions.poehali.dev/a4f6bfe1-8f77-48b2-b6dd-70ac0a1c023a?type=pages&organization_id=${id}`),
-        fetch(`https://functions.poehali.dev/1e66556d-e508-403d-aced-20637779242a?org_id=${id}`)
-      ]);
-
-      const orgData = await orgRes.json();
-      const modulesData = await modulesRes.json();
-      const pagesData = await pagesRes.json();
-      const pointsData = await pointsRes.json();
-
-      setOrganization(orgData);
-      setModules(modulesData);
-      setPages(pagesData);
-      setPointsBalance(pointsData.points_balance || 0);
-      setPointsEnabled(pointsData.is_enabled || false);
+      const response = await fetch(`https://functions.poehali.dev/5fa1bf89-3c17-4533-889a-7273e1ef1e3b?id=${id}&view=overview`);
+      if (!response.ok) throw new Error('Failed to load');
+      const overview = await response.json();
+
+      setOrganization(overview.organization);
+      setModules(overview.modules);
+      setPages(overview.pages);
+      setPointsBalance(overview.points.points_balance || 0);
+      setPointsEnabled(overview.points.is_enabled || false);
     } catch (error) {
       toast.error('Не удалось загрузить данные');
       console.error(error);
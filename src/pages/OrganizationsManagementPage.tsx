@@ -2,6 +2,7 @@ import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Button } from '@/components/ui/button';
 import { Card } from '@/components/ui/card';
+import { Input } from '@/components/ui/input';
 import Icon from '@/components/ui/icon';
 import { toast } from 'sonner';
 import BlockOrganizationDialog from '@/components/BlockOrganizationDialog';
@@ -19,12 +20,19 @@ interface Organization {
   page_count: number;
 }
 
+const ORGANIZATIONS_URL = 'https://functions.poehali.dev/5fa1bf89-3c17-4533-889a-7273e1ef1e3b';
+const PAGE_SIZE = 50;
+
 const OrganizationsManagementPage = () => {
   const navigate = useNavigate();
   const [organizations, setOrganizations] = useState<Organization[]>([]);
   const [loading, setLoading] = useState(true);
   const [blockDialogOpen, setBlockDialogOpen] = useState(false);
   const [selectedOrg, setSelectedOrg] = useState<Organization | null>(null);
+  const [search, setSearch] = useState('');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [total, setTotal] = useState(0);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const role = localStorage.getItem('userRole');
@@ -46,20 +54,33 @@ const OrganizationsManagementPage = () => {
       return;
     }
     
-    loadOrganizations();
   }, [navigate]);
 
-  const loadOrganizations = async () => {
+  useEffect(() => {
+    if (localStorage.getItem('userRole') !== 'superadmin') return;
+    const timer = setTimeout(() => loadOrganizations(), search ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [search]);
+
+  const loadOrganizations = async (cursor?: string) => {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+    if (search.trim()) params.set('search', search.trim());
+    if (cursor) params.set('cursor', cursor);
+
+    if (cursor) setLoadingMore(true);
     try {
-      const response = await fetch('https://functions.poehali.dev/5fa1bf89-3c17-4533-889a-7273e1ef1e3b');
+      const response = await fetch(`${ORGANIZATIONS_URL}?${params.toString()}`);
       if (!response.ok) throw new Error('Failed to load');
       const data = await response.json();
-      setOrganizations(data);
+      setOrganizations((prev) => (cursor ? [...prev, ...data.organizations] : data.organizations));
+      setNextCursor(data.next_cursor);
+      setTotal(data.total);
     } catch (error) {
       toast.error('Не удалось загрузить список предприятий');
       console.error(error);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -106,7 +127,7 @@ const OrganizationsManagementPage = () => {
             </div>
             <div>
               <h1 className="text-3xl font-bold text-white">Управление предприятиями</h1>
-              <p className="text-purple-400">Всего предприятий: {organizations.length}</p>
+              <p className="text-purple-400">Всего предприятий: {total}</p>
             </div>
           </div>
           <div className="flex gap-3">
@@ -130,7 +151,22 @@ const OrganizationsManagementPage = () => {
       </div>
 
       <div className="max-w-7xl mx-auto">
-        {organizations.length === 0 ? (
+        <div className="relative mb-6">
+          <Icon name="Search" size={20} className="absolute left-3 top-1/2 -translate-y-1/2 text-gray-400" />
+          <Input
+            value={search}
+            onChange={(e) => setSearch(e.target.value)}
+            placeholder="Поиск по названию предприятия"
+            className="pl-10 bg-slate-800/50 border-purple-600/30 text-white"
+          />
+        </div>
+
+        {organizations.length === 0 && search.trim() ? (
+          <Card className="p-12 text-center bg-slate-800/50 border-purple-600/30">
+            <Icon name="SearchX" size={64} className="mx-auto text-purple-400 mb-4" />
+            <h3 className="text-xl font-semibold text-white">Ничего не найдено</h3>
+          </Card>
+        ) : organizations.length === 0 ? (
           <Card className="p-12 text-center bg-slate-800/50 border-purple-600/30">
             <Icon name="Building2" size={64} className="mx-auto text-purple-400 mb-4" />
             <h3 className="text-xl font-semibold text-white mb-2">Нет зарегистрированных предприятий</h3>
@@ -258,6 +294,17 @@ const OrganizationsManagementPage = () => {
                 </div>
               </Card>
             ))}
+
+            {nextCursor && (
+              <Button
+                onClick={() => loadOrganizations(nextCursor)}
+                disabled={loadingMore}
+                variant="outline"
+                className="border-purple-600/50 text-purple-400 hover:bg-purple-600/10"
+              >
+                {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+              </Button>
+            )}
           </div>
         )}
       </div>
@@ -58,7 +58,9 @@ export default function PabDictionariesPage() {
 
   const loadDictionaries = async () => {
     try {
-      const response = await fetch('https://functions.poehali.dev/8a3ae143-7ece-49b7-9863-4341c4bef960');
+      const response = await fetch('https://functions.poehali.dev/8a3ae143-7ece-49b7-9863-4341c4bef960', {
+        headers: { 'X-User-Id': localStorage.getItem('userId') || '' }
+      });
       if (!response.ok) throw new Error('Ошибка загрузки');
       const data = await response.json();
       setDictionaries(data);
@@ -94,7 +96,7 @@ export default function PabDictionariesPage() {
       if (editingItem) {
         const response = await fetch('https://functions.poehali.dev/8a3ae143-7ece-49b7-9863-4341c4bef960', {
           method: 'PUT',
-          headers: { 'Content-Type': 'application/json' },
+          headers: { 'Content-Type': 'application/json', 'X-User-Id': localStorage.getItem('userId') || '' },
           body: JSON.stringify({
             type: dialogType,
             id: editingItem.id,
@@ -108,7 +110,7 @@ export default function PabDictionariesPage() {
       } else {
         const response = await fetch('https://functions.poehali.dev/8a3ae143-7ece-49b7-9863-4341c4bef960', {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
+          headers: { 'Content-Type': 'application/json', 'X-User-Id': localStorage.getItem('userId') || '' },
           body: JSON.stringify({
             type: dialogType,
             name: newItemName
@@ -137,7 +139,8 @@ export default function PabDictionariesPage() {
 
     try {
       const response = await fetch(`https://functions.poehali.dev/8a3ae143-7ece-49b7-9863-4341c4bef960?type=${type}&id=${id}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: { 'X-User-Id': localStorage.getItem('userId') || '' }
       });
 
       if (!response.ok) throw new Error('Ошибка удаления');
@@ -4,6 +4,7 @@ import Icon from '@/components/ui/icon';
 import { toast } from 'sonner';
 import { generatePabHtml } from '@/utils/generatePabHtml';
 import { uploadDocumentToStorage } from '@/utils/documentUpload';
+import { trackActivity } from '@/utils/activityBuffer';
 import { PabFormHeader } from '@/components/pab/PabFormHeader';
 import { PabObservationForm } from '@/components/pab/PabObservationForm';
 import { PabPhotoGallery } from '@/components/pab/PabPhotoGallery';
@@ -91,7 +92,9 @@ export default function PabRegistrationPage() {
       console.log('[PAB] Starting data load...');
       
       // Загрузка справочников
-      const dictResponse = await fetch('https://functions.poehali.dev/8a3ae143-7ece-49b7-9863-4341c4bef960');
+      const dictResponse = await fetch('https://functions.poehali.dev/8a3ae143-7ece-49b7-9863-4341c4bef960', {
+        headers: { 'X-User-Id': localStorage.getItem('userId') || '' }
+      });
       const dictData = await dictResponse.json();
       console.log('[PAB] Dictionaries loaded:', dictData);
       setDictionaries(dictData);
@@ -214,7 +217,7 @@ export default function PabRegistrationPage() {
       // Отправка ПАБ
       const response = await fetch('https://functions.poehali.dev/5054985e-ff94-4512-8302-c02f01b09d66', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-User-Id': userId },
         body: JSON.stringify({
           doc_number: newDocNumber,
           doc_date: docDate,
@@ -224,6 +227,7 @@ export default function PabRegistrationPage() {
           location,
           checked_object: checkedObject,
           photo_url: '',
+          user_id: Number(userId),
           responsible_email: responsibleEmail,
           admin_email: adminEmail,
           observations
@@ -232,6 +236,8 @@ export default function PabRegistrationPage() {
 
       if (!response.ok) throw new Error('Ошибка сохранения');
 
+      trackActivity('pab_create', { doc_number: newDocNumber });
+
       const organizationId = localStorage.getItem('organizationId');
       if (organizationId) {
         try {
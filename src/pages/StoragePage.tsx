@@ -111,6 +111,7 @@ const StoragePage = () => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           action: 'delete',
+          user_id: localStorage.getItem('userId'),
           folder_id: selectedFolder.id
         })
       });
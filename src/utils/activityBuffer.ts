@@ -0,0 +1,79 @@
+import FUNC_URLS from '../../backend/func2url.json';
+
+const STORAGE_KEY = 'activityBuffer';
+const FLUSH_SIZE = 50;
+const MAX_BUFFERED = 5000;
+const FLUSH_INTERVAL_MS = 60000;
+
+interface ActivityEvent {
+  client_event_id: string;
+  user_id: number;
+  activity_type: string;
+  occurred_at: string;
+  offline: boolean;
+  details?: Record<string, unknown>;
+}
+
+const activityUrl = (FUNC_URLS as Record<string, string>)['user-activity'];
+
+let flushing = false;
+
+const readBuffer = (): ActivityEvent[] => {
+  try {
+    return JSON.parse(localStorage.getItem(STORAGE_KEY) || '[]');
+  } catch {
+    return [];
+  }
+};
+
+const writeBuffer = (events: ActivityEvent[]) => {
+  localStorage.setItem(STORAGE_KEY, JSON.stringify(events.slice(-MAX_BUFFERED)));
+};
+
+export async function flushActivity(): Promise<void> {
+  if (flushing || !activityUrl || !navigator.onLine) return;
+
+  const events = readBuffer();
+  if (events.length === 0) return;
+
+  flushing = true;
+  try {
+    const response = await fetch(activityUrl, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ action: 'ingest', events })
+    });
+
+    if (response.ok) {
+      const sent = new Set(events.map((event) => event.client_event_id));
+      writeBuffer(readBuffer().filter((event) => !sent.has(event.client_event_id)));
+    }
+  } catch (error) {
+    console.log('Activity flush failed:', error);
+  } finally {
+    flushing = false;
+  }
+}
+
+export function trackActivity(activityType: string, details?: Record<string, unknown>): void {
+  const userId = localStorage.getItem('userId');
+  if (!userId) return;
+
+  const events = readBuffer();
+  events.push({
+    client_event_id: crypto.randomUUID(),
+    user_id: Number(userId),
+    activity_type: activityType,
+    occurred_at: new Date().toISOString(),
+    offline: !navigator.onLine,
+    details
+  });
+  writeBuffer(events);
+
+  if (events.length >= FLUSH_SIZE) {
+    void flushActivity();
+  }
+}
+
+window.addEventListener('online', () => void flushActivity());
+window.setInterval(() => void flushActivity(), FLUSH_INTERVAL_MS);
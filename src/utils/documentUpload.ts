@@ -87,6 +87,7 @@ export async function uploadDocumentToStorage({
     'https://functions.poehali.dev/cbbbbc82-61fa-4061-88d0-900cb586aea6',
     {
       method: 'POST',
+      headers: { 'X-User-Id': userId },
       body: formData
     }
   );